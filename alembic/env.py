@@ -1,9 +1,19 @@
+import os
+import sys
 from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config
 from sqlalchemy import pool
 
 from alembic import context
+from alembic.autogenerate import render, renderers
+from alembic.operations import ops
+
+# les modèles vivent dans backend/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+import models  # noqa: E402,F401  (enregistre les tables dans Base.metadata)
+from database import Base, DATABASE_URL  # noqa: E402
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -14,16 +24,48 @@ config = context.config
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
-# add your model's MetaData object here
-# for 'autogenerate' support
-# from myapp import mymodel
-# target_metadata = mymodel.Base.metadata
-target_metadata = None
-
-# other values from the config, defined by the needs of env.py,
-# can be acquired:
-# my_important_option = config.get_main_option("my_important_option")
-# ... etc.
+# même base que l'application (DATABASE_URL / .env)
+config.set_main_option("sqlalchemy.url", DATABASE_URL.replace("%", "%%"))
+
+# métadonnées des modèles, pour 'alembic revision --autogenerate'
+target_metadata = Base.metadata
+
+
+# Index créés/supprimés en ligne : CREATE INDEX CONCURRENTLY sur PostgreSQL
+# (pas de verrou d'écriture sur la table), hors transaction, et idempotents
+# (les bases créées par create_all les ont déjà).
+@renderers.dispatch_for(ops.CreateIndexOp, replace=True)
+def _render_create_index(autogen_context, op):
+    if autogen_context._has_batch:
+        return render._add_index(autogen_context, op)
+    op.kw["postgresql_concurrently"] = True
+    op.if_not_exists = True
+    return [
+        "with op.get_context().autocommit_block():",
+        render._add_index(autogen_context, op),
+        None,  # fin du bloc
+    ]
+
+
+# Tables créées seulement si absentes : les bases existantes les ont souvent
+# déjà (create_all au démarrage, DB_CREATE_ALL=1).
+@renderers.dispatch_for(ops.CreateTableOp, replace=True)
+def _render_create_table(autogen_context, op):
+    op.if_not_exists = True
+    return render._add_table(autogen_context, op)
+
+
+@renderers.dispatch_for(ops.DropIndexOp, replace=True)
+def _render_drop_index(autogen_context, op):
+    if autogen_context._has_batch:
+        return render._drop_index(autogen_context, op)
+    op.kw["postgresql_concurrently"] = True
+    op.if_exists = True
+    return [
+        "with op.get_context().autocommit_block():",
+        render._drop_index(autogen_context, op),
+        None,
+    ]
 
 
 def run_migrations_offline() -> None:
@@ -44,6 +86,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        compare_type=True,
     )
 
     with context.begin_transaction():
@@ -65,7 +108,11 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection,
+            target_metadata=target_metadata,
+            compare_type=True,
+            # une transaction par migration : autocommit_block() n'interrompt qu'elle
+            transaction_per_migration=True,
         )
 
         with context.begin_transaction():
@@ -0,0 +1,54 @@
+"""offers version triggers
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 18:02:11.512904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, Sequence[str], None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# toute écriture sur offers, même hors ORM, incrémente catalog_versions.offers
+BUMP = (
+    "INSERT INTO catalog_versions (name, version) VALUES ('offers', 1)"
+    " ON CONFLICT (name) DO UPDATE SET version = catalog_versions.version + 1"
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(
+            "CREATE OR REPLACE FUNCTION offers_version_bump() RETURNS trigger LANGUAGE plpgsql AS $$"
+            f" BEGIN {BUMP}; RETURN NULL; END $$"
+        )
+        op.execute("DROP TRIGGER IF EXISTS offers_version ON offers")
+        op.execute(
+            "CREATE TRIGGER offers_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON offers"
+            " FOR EACH STATEMENT EXECUTE FUNCTION offers_version_bump()"
+        )
+    else:
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            op.execute(
+                f"CREATE TRIGGER IF NOT EXISTS offers_version_{event.lower()} AFTER {event} ON offers"
+                f" BEGIN {BUMP}; END"
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP TRIGGER IF EXISTS offers_version ON offers")
+        op.execute("DROP FUNCTION IF EXISTS offers_version_bump()")
+    else:
+        for event in ("insert", "update", "delete"):
+            op.execute(f"DROP TRIGGER IF EXISTS offers_version_{event}")
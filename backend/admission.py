@@ -0,0 +1,285 @@
+"""Contrôle d'admission pour les ouvertures de ventes (middleware ASGI).
+
+Deux protections, appliquées avant le routage (aucun thread, aucune
+connexion SQL n'est pris pour une requête refusée) :
+
+  - débit : seaux de jetons par route d'écriture (ROUTE_LIMITS), un par
+    utilisateur authentifié et un par adresse IP (RATE_LIMIT_IP_FACTOR fois
+    plus large : plusieurs utilisateurs derrière un même NAT). Seau vide :
+    429 + Retry-After (temps avant le prochain jeton). Les seaux sont gardés
+    dans le processus (RATE_LIMIT_STORE=memory, défaut) ; un chemin de fichier
+    les partage entre les workers de la machine via SQLite, sans jamais
+    attendre un verrou (seau occupé par un autre worker : requête admise,
+    comptée dans admission_fail_open_total sur /metrics).
+  - concurrence : au-delà de ADMISSION_MAX_IN_FLIGHT requêtes en cours (toutes
+    routes), ou de ADMISSION_MAX_WRITES sur les routes limitées (par défaut la
+    taille du pool SQL), réponse immédiate 503 + Retry-After au lieu d'attendre
+    dans le threadpool et le pool de connexions. Ces compteurs sont propres à
+    chaque worker, comme son threadpool et son pool.
+
+Configuration : RATE_LIMIT_ENABLED=0 désactive le tout ; RATE_LIMIT_FORWARDED=1
+prend l'adresse du client dans X-Forwarded-For (derrière un reverse proxy).
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+from jose import JWTError, jwt
+
+from database import DB_MAX_OVERFLOW, DB_POOL_SIZE
+from routers.auth import ALGORITHM, SECRET_KEY
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1").lower() in ("1", "true", "yes")
+RATE_LIMIT_FORWARDED = os.getenv("RATE_LIMIT_FORWARDED", "0").lower() in ("1", "true", "yes")
+RATE_LIMIT_IP_FACTOR = float(os.getenv("RATE_LIMIT_IP_FACTOR", 5))
+RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "memory")  # ou chemin d'un fichier SQLite local
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", 256))
+ADMISSION_MAX_WRITES = int(os.getenv("ADMISSION_MAX_WRITES", DB_POOL_SIZE + DB_MAX_OVERFLOW))
+
+
+@dataclass(frozen=True)
+class RouteLimit:
+    rate: float  # jetons par seconde
+    burst: int   # capacité du seau
+
+
+# par utilisateur ; la limite par IP est multipliée par RATE_LIMIT_IP_FACTOR
+ROUTE_LIMITS: Dict[str, RouteLimit] = {
+    "POST /reservations": RouteLimit(rate=5, burst=20),
+    "POST /reservations/bulk": RouteLimit(rate=1, burst=5),
+    "POST /tickets/": RouteLimit(rate=10, burst=50),
+    "POST /payment/simulate": RouteLimit(rate=2, burst=10),
+    "POST /payment/checkout": RouteLimit(rate=2, burst=10),
+}
+
+# (clé, débit, capacité)
+Bucket = Tuple[str, float, float]
+
+
+def _take(tokens: Optional[float], updated: float, rate: float, burst: float, now: float) -> Tuple[float, float]:
+    """Remplit le seau depuis `updated` ; renvoie (jetons restants, attente avant le prochain jeton)"""
+    tokens = burst if tokens is None else min(burst, tokens + (now - updated) * rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / rate
+
+
+def _full_at(tokens: float, rate: float, burst: float, now: float) -> float:
+    # instant où le seau sera plein : au-delà, il est inutile de le garder
+    return now + (burst - tokens) / rate
+
+
+class MemoryStore:
+    """Seaux dans le processus (un worker, ou tests)"""
+
+    PRUNE_EVERY = 1000
+    fail_open = 0  # jamais indisponible
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}
+        self._lock = threading.Lock()
+        self._takes = 0
+
+    def take(self, buckets: Iterable[Bucket], now: float) -> float:
+        """Prend un jeton dans chaque seau, ou aucun ; renvoie l'attente (0 = admis)"""
+        with self._lock:
+            taken, wait = {}, 0.0
+            for key, rate, burst in buckets:
+                tokens, updated, _ = self._buckets.get(key, (None, now, now))
+                tokens, bucket_wait = _take(tokens, updated, rate, burst, now)
+                taken[key] = (tokens, now, _full_at(tokens, rate, burst, now))
+                wait = max(wait, bucket_wait)
+            if not wait:
+                self._buckets.update(taken)
+            self._takes += 1
+            if self._takes % self.PRUNE_EVERY == 0:
+                # mémoire bornée par le nombre de clients actifs, pas par tous ceux déjà vus
+                self._buckets = {key: bucket for key, bucket in self._buckets.items() if bucket[2] >= now}
+            return wait
+
+    def reset(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+class SQLiteStore:
+    """Seaux dans un fichier SQLite local, partagés par les workers de la machine.
+
+    Appelé sur la boucle d'événements : aucune attente de verrou (busy timeout
+    nul). Fichier verrouillé par un autre worker ou erreur : la requête est
+    admise plutôt que de bloquer la boucle. État jetable : synchronous=OFF.
+    """
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path: str, busy_timeout: float = 0.0):
+        self.path = path
+        self._busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._takes = 0
+        self.fail_open = 0  # requêtes admises faute de pouvoir lire les seaux
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self._busy_timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                " key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, full_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_buckets_full_at ON buckets (full_at)")
+            self._local.conn = conn
+        return conn
+
+    def take(self, buckets: Iterable[Bucket], now: float) -> float:
+        buckets = list(buckets)
+        try:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = dict(
+                    (key, (tokens, updated))
+                    for key, tokens, updated in conn.execute(
+                        f"SELECT key, tokens, updated FROM buckets WHERE key IN ({','.join('?' * len(buckets))})",
+                        [key for key, _, _ in buckets],
+                    )
+                )
+                taken, wait = [], 0.0
+                for key, rate, burst in buckets:
+                    tokens, updated = rows.get(key, (None, now))
+                    tokens, bucket_wait = _take(tokens, updated, rate, burst, now)
+                    wait = max(wait, bucket_wait)
+                    taken.append((key, tokens, now, _full_at(tokens, rate, burst, now)))
+                if not wait:
+                    conn.executemany("INSERT OR REPLACE INTO buckets VALUES (?, ?, ?, ?)", taken)
+                self._takes += 1
+                if self._takes % self.PRUNE_EVERY == 0:
+                    conn.execute("DELETE FROM buckets WHERE full_at < ?", (now,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            return wait
+        except sqlite3.Error:
+            self.fail_open += 1
+            return 0.0
+
+    def reset(self) -> None:
+        self._connection().execute("DELETE FROM buckets")
+
+
+def make_store(spec: str):
+    return MemoryStore() if spec == "memory" else SQLiteStore(spec)
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", ()):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def client_ip(scope) -> str:
+    if RATE_LIMIT_FORWARDED:
+        forwarded = _header(scope, b"x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "-"
+
+
+def user_key(scope) -> Optional[str]:
+    """Utilisateur du jeton Bearer (signature vérifiée : un jeton forgé ne vide pas le seau d'un autre)"""
+    authorization = _header(scope, b"authorization")
+    if not authorization or not authorization.lower().startswith("bearer "):
+        return None
+    try:
+        payload = jwt.decode(authorization[7:], SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    subject = payload.get("uid") or payload.get("sub")
+    return str(subject) if subject is not None else None
+
+
+class AdmissionController:
+    def __init__(self, store, limits: Dict[str, RouteLimit] = ROUTE_LIMITS):
+        self.store = store
+        self.limits = limits
+        self.max_in_flight = ADMISSION_MAX_IN_FLIGHT
+        self.max_writes = ADMISSION_MAX_WRITES
+        self.in_flight = 0
+        self.writes_in_flight = 0
+
+    def buckets(self, route: str, limit: RouteLimit, scope) -> Iterable[Bucket]:
+        user = user_key(scope)
+        if user is not None:
+            yield f"{route}|u:{user}", limit.rate, limit.burst
+        factor = RATE_LIMIT_IP_FACTOR
+        yield f"{route}|ip:{client_ip(scope)}", limit.rate * factor, limit.burst * factor
+
+    def check(self, route: str, scope) -> Optional[Tuple[int, float]]:
+        """None si la requête est admise, sinon (statut, attente en secondes)"""
+        limit = self.limits.get(route)
+        if self.in_flight >= self.max_in_flight or (limit is not None and self.writes_in_flight >= self.max_writes):
+            return 503, 1.0
+        if limit is not None:
+            wait = self.store.take(self.buckets(route, limit, scope), time.time())
+            if wait:
+                return 429, wait
+        return None
+
+
+controller = AdmissionController(make_store(RATE_LIMIT_STORE))
+
+
+def render_metrics() -> str:
+    """Compteurs d'admission au format texte Prometheus (ajoutés à /metrics)"""
+    return "\n".join([
+        "# HELP admission_fail_open_total Requêtes admises sans contrôle de débit (magasin des seaux indisponible)",
+        "# TYPE admission_fail_open_total counter",
+        f"admission_fail_open_total {controller.store.fail_open}",
+    ]) + "\n"
+
+_DETAILS = {
+    429: "Trop de requêtes, réessayez dans quelques instants",
+    503: "Serveur saturé, réessayez dans quelques instants",
+}
+
+
+class AdmissionMiddleware:
+    """Middleware ASGI pur : refus décidé avant toute lecture du corps de la requête"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        ctl = controller
+        route = f'{scope["method"]} {scope["path"]}'
+        rejection = ctl.check(route, scope)
+        if rejection is not None:
+            status, wait = rejection
+            response = JSONResponse(
+                {"detail": _DETAILS[status]}, status_code=status, headers={"Retry-After": str(math.ceil(wait))}
+            )
+            return await response(scope, receive, send)
+
+        limited = route in ctl.limits
+        ctl.in_flight += 1
+        if limited:
+            ctl.writes_in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            ctl.in_flight -= 1
+            if limited:
+                ctl.writes_in_flight -= 1
@@ -0,0 +1,50 @@
+"""Compare deux fichiers de résultats de benchmarks.run.
+
+Usage : python -m benchmarks.compare base.json new.json [--threshold 0.10]
+Code de sortie 1 si une mesure régresse au-delà du seuil (p50).
+"""
+import argparse
+import json
+import sys
+
+
+def compare(base: dict, new: dict, threshold: float):
+    regressions = []
+    rows = []
+    for name, result in new["results"].items():
+        previous = base["results"].get(name)
+        if previous is None:
+            rows.append((name, None, result["p50_ms"], None))
+            continue
+        change = (result["p50_ms"] - previous["p50_ms"]) / previous["p50_ms"] if previous["p50_ms"] else 0.0
+        rows.append((name, previous["p50_ms"], result["p50_ms"], change))
+        if change > threshold:
+            regressions.append(name)
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.10, help="régression tolérée sur le p50 (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    rows, regressions = compare(base, new, args.threshold)
+    print(f"{base['meta'].get('commit')} -> {new['meta'].get('commit')}")
+    for name, before, after, change in rows:
+        if before is None:
+            print(f"{name:32} {'-':>10} {after:>10.3f} ms  (nouveau)")
+        else:
+            flag = "  REGRESSION" if name in regressions else ""
+            print(f"{name:32} {before:>10.3f} {after:>10.3f} ms  {change:+.1%}{flag}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""Benchmarks des chemins chauds de l'API, hors ligne (SQLite ou base locale).
+
+Usage (depuis backend/) :
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --db sqlite:///bench.db --users 1000000 --reservations 2000000 --tickets 2000000
+    python -m benchmarks.compare old.json new.json
+
+La base est (re)créée et remplie par benchmarks.seed si elle est vide.
+Les résultats (JSON) incluent le commit, la configuration et, pour chaque
+mesure, les percentiles de latence et le débit.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+
+def measure(fn, iterations, warmup=3):
+    for _ in range(min(warmup, iterations)):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "iterations": iterations,
+        "mean_ms": round(statistics.fmean(samples), 4),
+        "p50_ms": round(samples[len(samples) // 2], 4),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+        "min_ms": round(samples[0], 4),
+        "ops_per_s": round(1000 / statistics.fmean(samples), 2),
+    }
+
+
+def ok(response):
+    """Réponse 2xx attendue : mesurer des erreurs (401, 429...) fausserait les résultats"""
+    response.raise_for_status()
+    return response
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    os.environ["DATABASE_URL"] = args.db
+    if args.use_async:
+        os.environ["DB_ASYNC"] = "1"
+    # un seul utilisateur en boucle : sans cela on mesurerait des refus 429
+    os.environ["RATE_LIMIT_ENABLED"] = "0"
+
+    import models
+    from benchmarks import seed as seeding
+    from database import SessionLocal, engine
+    from fastapi.testclient import TestClient
+    from hashing import hasher
+    import qr_cache
+    from routers import auth
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from pagination import model_columns
+    import serialization
+    from sqlalchemy import inspect, select
+
+    seeded = False
+    if inspect(engine).has_table(models.User.__tablename__):
+        with SessionLocal() as db:
+            seeded = db.query(models.User.id).first() is not None
+    dataset = None
+    if not seeded:
+        dataset = seeding.seed(engine, args.users, args.reservations, args.tickets, args.user_tickets,
+                               unpaid_tickets=args.iterations + 10)
+
+    from main import app
+
+    results = {}
+    with TestClient(app) as client:
+        def login(email):
+            res = client.post("/auth/login", json={"email": email, "password": seeding.BENCH_PASSWORD})
+            res.raise_for_status()
+            return {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+        user = login(seeding.USER_EMAIL)
+        admin = login(seeding.ADMIN_EMAIL)
+        with SessionLocal() as db:
+            stored_hash = db.query(models.User.password).filter(models.User.id == 1).scalar()
+            unpaid = [
+                t for (t,) in db.query(models.Ticket.id)
+                .filter(models.Ticket.user_id == 1, models.Ticket.is_paid == False)  # noqa: E712
+                .order_by(models.Ticket.id)
+                .limit(args.iterations + 3)
+            ]
+        it = args.iterations
+
+        results["login_hash_verify"] = measure(
+            lambda: hasher.verify(seeding.BENCH_PASSWORD, stored_hash), max(3, it // 10))
+        results["login_http"] = measure(lambda: login(seeding.USER_EMAIL), max(3, it // 10))
+        results["get_current_user_cached"] = measure(lambda: ok(client.get("/auth/me", headers=user)), it)
+
+        def cold_me():
+            auth.principal_cache.clear()
+            ok(client.get("/auth/me", headers=user))
+        results["get_current_user_cold"] = measure(cold_me, it)
+
+        results["admin_reservations_all_page"] = measure(
+            lambda: ok(client.get("/admin/reservations/all?limit=100", headers=admin)), it)
+        results["admin_stats"] = measure(lambda: ok(client.get("/admin/stats", headers=admin)), it)
+        results["admin_stats_fresh"] = measure(
+            lambda: ok(client.get("/admin/stats?fresh=true", headers=admin)), max(3, it // 10))
+
+        # un ticket impayé par appel (échauffement compris) : la base s'épuise au fil des exécutions
+        pending = iter(unpaid)
+        if len(unpaid) >= 4:
+            results["simulate_payment"] = measure(
+                lambda: ok(client.post("/payment/simulate", json={"ticket_id": next(pending)}, headers=user)),
+                min(it, len(unpaid) - 3))
+        else:
+            print("simulate_payment ignoré : plus assez de tickets impayés (recréer la base de benchmark)",
+                  file=sys.stderr)
+
+        counter = iter(range(10 ** 9))
+        results["qr_render_png_cold"] = measure(
+            lambda: qr_cache._render(f"OLY-{next(counter)}-bench", "png"), max(3, it // 5))
+        results["qr_render_svg_cold"] = measure(
+            lambda: qr_cache._render(f"OLY-{next(counter)}-bench", "svg"), max(3, it // 5))
+        results["qr_render_cached"] = measure(lambda: qr_cache.render_qr("OLY-1-bench", "png"), it)
+
+        results["list_tickets_me"] = measure(lambda: ok(client.get("/tickets/me", headers=user)), max(3, it // 5))
+        results["list_reservations"] = measure(lambda: ok(client.get("/reservations", headers=user)), max(3, it // 5))
+        results["list_tickets_me_1000"] = measure(
+            lambda: ok(client.get("/tickets/me?limit=1000", headers=user)), max(3, it // 5))
+
+        # sérialisation seule d'une grande liste : encodeur générique de FastAPI vs orjson sur les lignes
+        with SessionLocal() as db:
+            rows = db.execute(
+                select(*model_columns(models.Ticket).values()).where(models.Ticket.user_id == 1).limit(1000)
+            ).all()
+        results["serialize_list_jsonable_encoder"] = measure(
+            lambda: JSONResponse(jsonable_encoder([row._asdict() for row in rows])), it)
+        results["serialize_list_orjson_rows"] = measure(
+            lambda: serialization.rows_response(rows, len(rows) + 1), it)
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "database": engine.url.render_as_string(hide_password=True),
+            "db_async": args.use_async,
+            "iterations": args.iterations,
+            "dataset": dataset,
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks des chemins chauds de l'API")
+    parser.add_argument("--db", default=os.getenv("DATABASE_URL", "sqlite:///bench.db"))
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--reservations", type=int, default=50_000)
+    parser.add_argument("--tickets", type=int, default=50_000)
+    parser.add_argument("--user-tickets", type=int, default=2_000)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--async", dest="use_async", action="store_true", help="sessions asynchrones (DB_ASYNC=1)")
+    parser.add_argument("--output", help="fichier JSON de résultats (sinon stdout)")
+    args = parser.parse_args()
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+    for name, result in report["results"].items():
+        print(f"{name:32} p50={result['p50_ms']:>9.3f} ms  p95={result['p95_ms']:>9.3f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Générateur de jeu de données synthétique (insertion en masse).
+
+Usage (depuis backend/) :
+    python -m benchmarks.seed --db sqlite:///bench.db --users 1000000 --reservations 2000000 --tickets 2000000
+"""
+import argparse
+import os
+import random
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import insert, text
+
+BENCH_PASSWORD = "bench-password"
+ADMIN_EMAIL = "admin@bench.local"
+USER_EMAIL = "user0@bench.local"  # utilisateur "chargé" : ses tickets servent aux benchs de liste
+
+OFFERS = [("Solo", 25.0), ("Duo", 50.0), ("Familiale", 150.0)]
+FIRST_DAY = date(2024, 7, 26)
+DAYS = 17
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _bulk_insert(conn, table, rows, batch_size):
+    count = 0
+    for batch in _batches(rows, batch_size):
+        conn.execute(insert(table), batch)
+        count += len(batch)
+    return count
+
+
+def _reset_sequences(conn, tables):
+    # PostgreSQL : ids insérés explicitement, les séquences SERIAL n'ont pas avancé
+    if conn.dialect.name != "postgresql":
+        return
+    for table in tables:
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), COALESCE(MAX(id), 1), MAX(id) IS NOT NULL)"
+            f" FROM {table.name}"
+        ))
+
+
+def seed(engine, users=10_000, reservations=50_000, tickets=50_000, user_tickets=2_000,
+         unpaid_tickets=2_000, batch_size=20_000, seed_value=42):
+    """Remplit une base vide ; renvoie les volumes insérés et la durée"""
+    import models
+    from database import Base
+    from hashing import hasher
+
+    rng = random.Random(seed_value)
+    Base.metadata.create_all(bind=engine)
+    started = time.perf_counter()
+    # un seul hash bcrypt partagé : le coût du seed reste celui des INSERT
+    password = hasher.hash(BENCH_PASSWORD)
+    now = datetime.utcnow()
+
+    def user_rows():
+        yield {"id": 1, "username": "user0", "email": USER_EMAIL, "password": password, "is_admin": False}
+        yield {"id": 2, "username": "admin", "email": ADMIN_EMAIL, "password": password, "is_admin": True}
+        for i in range(3, users + 1):
+            yield {"id": i, "username": f"user{i}", "email": f"user{i}@bench.local",
+                   "password": password, "is_admin": False}
+
+    def reservation_rows():
+        for i in range(1, reservations + 1):
+            name, _ = OFFERS[rng.randrange(len(OFFERS))]
+            yield {
+                "id": i,
+                "user_id": rng.randint(1, users),
+                "date": FIRST_DAY + timedelta(days=rng.randrange(DAYS)),
+                "offre": name,
+                "quantity": rng.randint(1, 4),
+                "status": "confirmed" if rng.random() < 0.6 else "pending_payment",
+            }
+
+    def ticket_rows():
+        total = tickets + user_tickets + unpaid_tickets
+        for i in range(1, total + 1):
+            if i <= tickets:
+                user_id = rng.randint(1, users)
+                paid = rng.random() < 0.6
+            elif i <= tickets + user_tickets:
+                user_id, paid = 1, True
+            else:
+                # tickets non payés de user0 : consommés par le bench de paiement
+                user_id, paid = 1, False
+            offer_id = rng.randint(1, len(OFFERS))
+            final_key = f"T{user_id}-{offer_id}-{uuid.UUID(int=rng.getrandbits(128)).hex[:10]}" if paid else None
+            yield {
+                "id": i,
+                "user_id": user_id,
+                "offer_id": offer_id,
+                "reservation_id": rng.randint(1, reservations) if reservations and rng.random() < 0.5 else None,
+                "final_key": final_key,
+                "qr_code": f"OLY-{i}-{final_key}" if paid else None,
+                "is_used": False,
+                "is_paid": paid,
+                "payment_status": "paid" if paid else "pending",
+                "payment_date": now if paid else None,
+                "amount": OFFERS[offer_id - 1][1],
+            }
+
+    with engine.begin() as conn:
+        _bulk_insert(conn, models.Offer.__table__, (
+            {"id": i, "name": name, "description": name, "price": price, "capacity": None, "is_active": True}
+            for i, (name, price) in enumerate(OFFERS, 1)
+        ), batch_size)
+        counts = {
+            "users": _bulk_insert(conn, models.User.__table__, user_rows(), batch_size),
+            "reservations": _bulk_insert(conn, models.Reservation.__table__, reservation_rows(), batch_size),
+            "tickets": _bulk_insert(conn, models.Ticket.__table__, ticket_rows(), batch_size),
+        }
+        _reset_sequences(conn, [
+            models.Offer.__table__, models.User.__table__, models.Reservation.__table__, models.Ticket.__table__,
+        ])
+
+    counts["seconds"] = round(time.perf_counter() - started, 2)
+    counts["unpaid_ticket_ids"] = [tickets + user_tickets + 1, tickets + user_tickets + unpaid_tickets]
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Jeu de données synthétique pour les benchmarks")
+    parser.add_argument("--db", default=os.getenv("DATABASE_URL", "sqlite:///bench.db"))
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--reservations", type=int, default=50_000)
+    parser.add_argument("--tickets", type=int, default=50_000)
+    parser.add_argument("--user-tickets", type=int, default=2_000)
+    parser.add_argument("--batch-size", type=int, default=20_000)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.db
+    from database import engine
+
+    counts = seed(engine, args.users, args.reservations, args.tickets, args.user_tickets,
+                  batch_size=args.batch_size)
+    print(counts)
+
+
+if __name__ == "__main__":
+    main()
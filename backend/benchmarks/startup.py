@@ -0,0 +1,48 @@
+"""Démarrage à froid d'un worker : nouveau processus, import de main, lifespan, première requête.
+
+Usage (depuis backend/) :
+    python -m benchmarks.startup --db sqlite:///bench.db --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# exécuté dans un processus neuf : rien n'est encore importé
+_CHILD = """
+import time
+started = time.perf_counter()
+from fastapi.testclient import TestClient
+import main
+with TestClient(main.app) as client:
+    client.get("/offers").raise_for_status()
+print((time.perf_counter() - started) * 1000)
+"""
+
+
+def cold_start_ms(db: str) -> float:
+    env = {**os.environ, "DATABASE_URL": db}
+    output = subprocess.check_output([sys.executable, "-c", _CHILD], env=env, text=True)
+    return float(output.split()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Démarrage à froid jusqu'à la première requête servie")
+    parser.add_argument("--db", default=os.getenv("DATABASE_URL", "sqlite:///bench.db"))
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    cold_start_ms(args.db)  # crée le schéma au besoin
+    samples = sorted(cold_start_ms(args.db) for _ in range(args.runs))
+    print(json.dumps({
+        "runs": args.runs,
+        "p50_ms": round(samples[len(samples) // 2], 1),
+        "min_ms": round(samples[0], 1),
+        "mean_ms": round(statistics.fmean(samples), 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Catalogue des offres en mémoire (données de référence, rarement modifiées).
+
+Chargé au démarrage et indexé par id et par nom normalisé. Toute écriture sur
+la table offers (ORM, SQL brut, scripts) incrémente `catalog_versions.offers`
+dans la même transaction, par trigger (models.OFFERS_VERSION_TRIGGERS) ; chaque
+processus relit cette version au plus toutes les CATALOG_CHECK_INTERVAL
+secondes (une requête sur clé primaire) et recharge le catalogue si elle a changé.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+
+from models import CatalogVersion, Offer
+
+CATALOG_CHECK_INTERVAL = float(os.getenv("CATALOG_CHECK_INTERVAL", 5))  # s
+CATALOG_NAME = "offers"
+
+
+@dataclass(frozen=True)
+class OfferInfo:
+    id: int
+    name: str
+    description: Optional[str]
+    price: Optional[float]
+    capacity: Optional[int]
+    is_active: bool
+
+
+class OfferSnapshot:
+    """Offres à une version donnée (immuable, partagée entre les requêtes)"""
+
+    def __init__(self, version: int, offers: List[OfferInfo]):
+        self.version = version
+        self.offers = offers
+        self._by_id = {offer.id: offer for offer in offers}
+        self._by_name: Dict[str, OfferInfo] = {}
+        for offer in offers:  # ordre des id : la première offre d'un nom l'emporte
+            self._by_name.setdefault(normalize(offer.name), offer)
+        body = json.dumps([asdict(offer) for offer in offers if offer.is_active])
+        self.body = body.encode()
+        self.etag = f'"{hashlib.sha256(self.body).hexdigest()[:32]}"'
+
+    def get(self, offer_id: int) -> Optional[OfferInfo]:
+        return self._by_id.get(offer_id)
+
+    def by_name(self, name: Optional[str]) -> Optional[OfferInfo]:
+        return self._by_name.get(normalize(name))
+
+
+def normalize(name: Optional[str]) -> str:
+    return (name or "").strip().lower()
+
+
+class OfferCatalog:
+    def __init__(self, check_interval: float = CATALOG_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._snapshot: Optional[OfferSnapshot] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def fresh(self) -> Optional[OfferSnapshot]:
+        """Catalogue courant s'il a été vérifié récemment, sinon None"""
+        if self._snapshot is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return self._snapshot
+        return None
+
+    def refresh(self, db: Session) -> OfferSnapshot:
+        """Relit la version ; recharge les offres seulement si elle a changé"""
+        # requêtes hors verrou : en mode async elles cèdent la boucle d'événements
+        # (run_sync), et une autre coroutine bloquée sur le verrou la figerait
+        current = self._snapshot
+        version = db.scalar(select(CatalogVersion.version).where(CatalogVersion.name == CATALOG_NAME)) or 0
+        snapshot = current
+        if current is None or current.version != version:
+            offers = db.scalars(select(Offer).order_by(Offer.id)).all()
+            snapshot = OfferSnapshot(version, [
+                OfferInfo(o.id, o.name, o.description, o.price, o.capacity, bool(o.is_active))
+                for o in offers
+            ])
+        with self._lock:
+            # une relecture concurrente plus récente n'est pas écrasée
+            if self._snapshot is current or self._snapshot.version <= snapshot.version:
+                self._snapshot = snapshot
+            self._checked_at = time.monotonic()
+            return self._snapshot
+
+    def invalidate(self) -> None:
+        """Force une relecture de la version au prochain accès"""
+        self._checked_at = 0.0
+
+
+catalog = OfferCatalog()
+
+
+async def get_catalog(db) -> OfferSnapshot:
+    """Catalogue à jour (db : AsyncSession ou SyncSessionAdapter)"""
+    snapshot = catalog.fresh()
+    if snapshot is None:
+        snapshot = await db.run_sync(catalog.refresh)
+    return snapshot
+
+
+@event.listens_for(Offer, "after_insert")
+@event.listens_for(Offer, "after_update")
+@event.listens_for(Offer, "after_delete")
+def _offer_changed(mapper, connection, target):
+    # version incrémentée par trigger ; on note seulement l'écriture pour ce processus
+    session = object_session(target)
+    if session is not None:
+        session.info["offers_changed"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _reload_after_commit(session):
+    # ce processus relit la version dès le commit, sans attendre l'intervalle
+    if session.info.pop("offers_changed", False):
+        catalog.invalidate()
@@ -0,0 +1,79 @@
+"""Exports complets (CSV / NDJSON) diffusés ligne à ligne.
+
+Les lignes sont lues par lots via un curseur côté serveur
+(database.stream_partitions) et encodées au fil de l'eau : la mémoire reste
+celle d'un lot (EXPORT_BATCH_SIZE lignes) quelle que soit la taille de
+l'export, et les en-têtes HTTP (puis l'en-tête CSV) partent avant la
+première requête.
+"""
+import csv
+import io
+import os
+from datetime import date, datetime
+from typing import Callable, List, Optional
+
+from fastapi.responses import StreamingResponse
+
+from database import stream_partitions
+from serialization import dumps
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 5000))
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def _as_dict(row) -> dict:
+    return row._asdict()
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+async def _csv_chunks(stmt, columns: List[str], to_dict: Callable, batch_size: int, replica: bool):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue().encode()
+    async for partition in stream_partitions(stmt, batch_size, replica):
+        buffer.seek(0)
+        buffer.truncate()
+        for row in partition:
+            record = to_dict(row)
+            writer.writerow([_csv_value(record[column]) for column in columns])
+        yield buffer.getvalue().encode()
+
+
+async def _ndjson_chunks(stmt, to_dict: Callable, batch_size: int, replica: bool):
+    async for partition in stream_partitions(stmt, batch_size, replica):
+        yield b"".join(dumps(to_dict(row)) + b"\n" for row in partition)
+
+
+def export_response(
+    stmt,
+    columns: List[str],
+    fmt: str,
+    name: str,
+    to_dict: Optional[Callable] = None,
+    batch_size: int = EXPORT_BATCH_SIZE,
+    replica: bool = False,
+) -> StreamingResponse:
+    """Réponse diffusant `stmt` en CSV (colonnes `columns`) ou en NDJSON, lue sur le réplica si `replica`"""
+    to_dict = to_dict or _as_dict
+    if fmt == "csv":
+        body = _csv_chunks(stmt, columns, to_dict, batch_size, replica)
+    else:
+        body = _ndjson_chunks(stmt, to_dict, batch_size, replica)
+    filename = f"{name}-{datetime.utcnow():%Y%m%d-%H%M%S}.{fmt}"
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -0,0 +1,250 @@
+"""Contrôle des billets aux portes du site (scan des QR codes).
+
+Payload d'un QR : OLY-{ticket.id}-{final_key}. Les tickets payés sont
+préchargés en mémoire (id -> final_key, et tickets déjà utilisés) derrière un
+filtre de Bloom : un payload inconnu ou forgé est rejeté sans requête SQL.
+Un billet valide est consommé par un UPDATE conditionnel (`is_used = false`),
+atomique côté base : deux portes (ou deux workers) ne peuvent pas valider le
+même billet, et tout rescan est refusé comme rejeu.
+
+Les tickets payés après le chargement sont ajoutés par un rafraîchissement
+incrémental (payment_date récente), déclenché au plus toutes les
+GATE_REFRESH_INTERVAL secondes lorsqu'un payload est inconnu.
+
+Les QR signés (OLYS., voir qr_signing) sont vérifiés sans l'index : signature,
+expiration et liste des billets révoqués (table revoked_tickets, aussi
+poussée aux portes hors ligne).
+"""
+import hashlib
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from models import RevokedTicket, Ticket
+import qr_signing
+
+GATE_REFRESH_INTERVAL = float(os.getenv("GATE_REFRESH_INTERVAL", 2))  # s
+GATE_BLOOM_ERROR_RATE = float(os.getenv("GATE_BLOOM_ERROR_RATE", 0.001))
+QR_PREFIX = "OLY"
+
+VALID = "valid"
+REPLAY = "replay"
+INVALID = "invalid"
+REVOKED = "revoked"
+
+
+class BloomFilter:
+    """Filtre de Bloom (faux positifs possibles, jamais de faux négatifs)"""
+
+    def __init__(self, capacity: int, error_rate: float = GATE_BLOOM_ERROR_RATE):
+        capacity = max(capacity, 1024)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.capacity = capacity
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+def parse_payload(payload: str) -> Optional[Tuple[int, str]]:
+    """(ticket_id, final_key) d'un payload OLY-{id}-{final_key}, ou None"""
+    parts = (payload or "").strip().split("-", 2)
+    if len(parts) != 3 or parts[0] != QR_PREFIX or not parts[1].isdigit() or not parts[2]:
+        return None
+    return int(parts[1]), parts[2]
+
+
+class GateIndex:
+    """Index mémoire des billets payés (un par processus)"""
+
+    def __init__(self):
+        self.keys: Dict[int, str] = {}
+        self.used: Set[int] = set()
+        self.revoked: Set[int] = set()
+        self.bloom = BloomFilter(0)
+        self.loaded_at: Optional[datetime] = None
+        self._refreshed_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    def load(self, db: Session) -> dict:
+        """(Re)charge tous les billets payés"""
+        started = datetime.utcnow()
+        keys, used = {}, set()
+        rows = db.execute(
+            select(Ticket.id, Ticket.final_key, Ticket.is_used)
+            .where(Ticket.is_paid == True, Ticket.final_key.is_not(None))  # noqa: E712
+            .execution_options(yield_per=10_000)
+        )
+        for ticket_id, final_key, is_used in rows:
+            keys[ticket_id] = final_key
+            if is_used:
+                used.add(ticket_id)
+        revoked = set(db.scalars(select(RevokedTicket.ticket_id)).all())
+        # marge de 50 % pour les billets payés après le chargement
+        bloom = BloomFilter(int(len(keys) * 1.5))
+        for ticket_id, final_key in keys.items():
+            bloom.add(f"{QR_PREFIX}-{ticket_id}-{final_key}")
+        with self._lock:
+            self.keys, self.used, self.revoked, self.bloom = keys, used, revoked, bloom
+            self.loaded_at = started
+            self._refreshed_at = time.monotonic()
+        return self.status()
+
+    def refresh(self, db: Session) -> int:
+        """Ajoute les billets payés depuis le dernier chargement"""
+        since = self.loaded_at - timedelta(seconds=1)  # marge pour les horloges/transactions
+        started = datetime.utcnow()
+        rows = db.execute(
+            select(Ticket.id, Ticket.final_key, Ticket.is_used).where(
+                Ticket.payment_date >= since,
+                Ticket.is_paid == True,  # noqa: E712
+                Ticket.final_key.is_not(None),
+            )
+        ).all()
+        revoked = db.scalars(select(RevokedTicket.ticket_id).where(RevokedTicket.revoked_at >= since)).all()
+        with self._lock:
+            self.revoked.update(revoked)
+            for ticket_id, final_key, is_used in rows:
+                if ticket_id not in self.keys:
+                    self.bloom.add(f"{QR_PREFIX}-{ticket_id}-{final_key}")
+                self.keys[ticket_id] = final_key
+                if is_used:
+                    self.used.add(ticket_id)
+            self.loaded_at = started
+            self._refreshed_at = time.monotonic()
+        return len(rows)
+
+    def mark_used(self, ticket_ids: Iterable[int]) -> None:
+        """À appeler après le commit des scans validés (ou rejoués)"""
+        with self._lock:
+            self.used.update(ticket_ids)
+
+    def mark_revoked(self, ticket_ids: Iterable[int]) -> None:
+        with self._lock:
+            self.revoked.update(ticket_ids)
+
+    def status(self) -> dict:
+        return {
+            "loaded_at": self.loaded_at.isoformat() if self.loaded_at else None,
+            "tickets": len(self.keys),
+            "used": len(self.used),
+            "revoked": len(self.revoked),
+            "bloom_bits": self.bloom.size,
+            "bloom_hashes": self.bloom.hashes,
+        }
+
+    def _known(self, payload: str, parsed: Optional[Tuple[int, str]]) -> bool:
+        return parsed is not None and payload in self.bloom and self.keys.get(parsed[0]) == parsed[1]
+
+    @staticmethod
+    def _parse(payload: str):
+        """(ticket_id, final_key) d'un QR classique, SignedTicket d'un QR signé valide, ou None"""
+        if not qr_signing.is_signed(payload):
+            return parse_payload(payload)
+        if qr_signing.signer is None:
+            return None
+        try:
+            return qr_signing.signer.verify(payload)
+        except qr_signing.InvalidPayload:
+            return None
+
+    def validate(self, db: Session, payloads: Iterable[str]) -> List[dict]:
+        """Valide et consomme des scans (dans l'ordre) ; un seul UPDATE pour le lot.
+
+        Le premier scan d'un billet l'emporte, les suivants sont des rejeux.
+        L'appelant commit puis appelle mark_used().
+        """
+        if not self.loaded:
+            self.load(db)
+        payloads = [(p or "").strip() for p in payloads]
+        parsed = [self._parse(p) for p in payloads]
+        signed = [isinstance(t, qr_signing.SignedTicket) for t in parsed]
+
+        # payloads inconnus : billets peut-être payés depuis le chargement
+        if any(not self._known(p, t) for p, t, s in zip(payloads, parsed, signed) if t is not None and not s):
+            if time.monotonic() - self._refreshed_at >= GATE_REFRESH_INTERVAL:
+                self.refresh(db)
+
+        results: List[dict] = []
+        candidates = {}
+        for index, (payload, ticket, is_signed) in enumerate(zip(payloads, parsed, signed)):
+            if not is_signed and not self._known(payload, ticket):
+                results.append({"status": INVALID, "ticket_id": ticket[0] if ticket else None})
+                continue
+            ticket_id = ticket[0]
+            if ticket_id in self.revoked:
+                results.append({"status": REVOKED, "ticket_id": ticket_id})
+                continue
+            if ticket_id in self.used or ticket_id in candidates:
+                results.append({"status": REPLAY, "ticket_id": ticket_id})
+                continue
+            candidates[ticket_id] = index
+            results.append(None)
+
+        consumed = set()
+        if candidates:
+            consumed = set(db.scalars(
+                update(Ticket)
+                .where(
+                    Ticket.id.in_(list(candidates)),
+                    Ticket.is_used == False,  # noqa: E712
+                    Ticket.id.not_in(select(RevokedTicket.ticket_id)),
+                )
+                .values(is_used=True)
+                .returning(Ticket.id)
+                .execution_options(synchronize_session=False)
+            ).all())
+        for ticket_id, index in candidates.items():
+            results[index] = {"status": VALID if ticket_id in consumed else REPLAY, "ticket_id": ticket_id}
+        return results
+
+
+gate_index = GateIndex()
+
+
+def revoke(db: Session, ticket_ids: Iterable[int], reason: Optional[str] = None) -> List[int]:
+    """Révoque des billets (sans commit) ; renvoie les nouveaux révoqués"""
+    ticket_ids = list(dict.fromkeys(ticket_ids))
+    if not ticket_ids:
+        return []
+    dialect = db.get_bind().dialect.name
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    revoked_at = datetime.utcnow()
+    return list(db.scalars(
+        insert(RevokedTicket)
+        .values([{"ticket_id": tid, "reason": reason, "revoked_at": revoked_at} for tid in ticket_ids])
+        .on_conflict_do_nothing()
+        .returning(RevokedTicket.ticket_id)
+    ).all())
+
+
+def revocations(db: Session, since: Optional[datetime] = None) -> List[int]:
+    """Billets révoqués (depuis `since`), pour les portes hors ligne"""
+    stmt = select(RevokedTicket.ticket_id).order_by(RevokedTicket.ticket_id)
+    if since is not None:
+        stmt = stmt.where(RevokedTicket.revoked_at >= since)
+    return list(db.scalars(stmt).all())
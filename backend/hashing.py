@@ -1,12 +1,165 @@
+"""Service unique de hachage des mots de passe.
+
+Le hachage (bcrypt, ou argon2 en opt-in) est CPU-bound : il tourne dans un
+pool dédié (threads ou processus) au lieu du threadpool partagé de FastAPI,
+avec un plafond de concurrence et une file d'attente bornée. Au-delà, les
+appels échouent immédiatement avec `HashingBusy` (backpressure).
+
+Configuration (variables d'environnement) :
+    PASSWORD_HASH_SCHEME     bcrypt (défaut) | argon2 (nécessite argon2-cffi)
+    PASSWORD_HASH_EXECUTOR   thread (défaut) | process
+    PASSWORD_HASH_WORKERS    nombre de hachages simultanés (défaut : nb de CPU)
+    PASSWORD_HASH_MAX_QUEUE  demandes en attente tolérées au-delà (défaut : 64)
+    PASSWORD_HASH_TARGET_MS  latence visée ; calibre le coût au démarrage (0 = coût par défaut)
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Tuple
+
 from passlib.context import CryptContext
 
-pwd_cxt = CryptContext(schemes=["bcrypt"], deprecated="auto")
+PASSWORD_HASH_SCHEME = os.getenv("PASSWORD_HASH_SCHEME", "bcrypt")
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 2))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", 64))
+PASSWORD_HASH_TARGET_MS = float(os.getenv("PASSWORD_HASH_TARGET_MS", 0))
+
+# bornes du calibrage : (paramètre de coût, min, max)
+_COST_SETTINGS = {
+    "bcrypt": ("rounds", 10, 16),
+    "argon2": ("time_cost", 2, 12),
+}
+
+
+class HashingBusy(Exception):
+    """Trop de hachages en cours ou en attente"""
+
+
+def _build_context(scheme: str, cost: Optional[int] = None) -> CryptContext:
+    # bcrypt reste toujours vérifiable : les anciens hash sont rehachés au login
+    schemes = [scheme] if scheme == "bcrypt" else [scheme, "bcrypt"]
+    settings = {}
+    if cost is not None:
+        name = _COST_SETTINGS[scheme][0]
+        settings[f"{scheme}__{name}"] = cost
+        settings[f"{scheme}__min_{name}"] = cost
+    return CryptContext(schemes=schemes, deprecated="auto", **settings)
+
+
+# --- exécution dans un processus fils : le contexte est reconstruit depuis sa config ---
+_worker_contexts = {}
+
+
+def _worker_context(config: str) -> CryptContext:
+    context = _worker_contexts.get(config)
+    if context is None:
+        context = _worker_contexts[config] = CryptContext.from_string(config)
+    return context
+
+
+def _hash_in_worker(config: str, password: str) -> str:
+    return _worker_context(config).hash(password)
+
+
+def _verify_in_worker(config: str, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    return _worker_context(config).verify_and_update(password, hashed)
+
+
+class PasswordHasher:
+    def __init__(
+        self,
+        scheme: str = PASSWORD_HASH_SCHEME,
+        workers: int = PASSWORD_HASH_WORKERS,
+        max_queue: int = PASSWORD_HASH_MAX_QUEUE,
+        executor: str = PASSWORD_HASH_EXECUTOR,
+    ):
+        self.scheme = scheme
+        self.workers = workers
+        self.max_queue = max_queue
+        self.executor_kind = executor
+        self.context = _build_context(scheme)
+        self._config = self.context.to_string()
+        self._executor: Optional[Executor] = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    # --- calibrage ---
+    def calibrate(self, target_ms: float = PASSWORD_HASH_TARGET_MS) -> Optional[int]:
+        """Choisit le coût le plus élevé dont le hachage tient dans target_ms"""
+        if not target_ms:
+            return None
+        _, low, high = _COST_SETTINGS[self.scheme]
+        chosen = low
+        for cost in range(low, high + 1):
+            context = _build_context(self.scheme, cost)
+            started = time.perf_counter()
+            context.hash("calibration")
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if elapsed_ms > target_ms:
+                break
+            chosen = cost
+            # le coût double à chaque cran pour bcrypt : inutile d'essayer plus
+            if self.scheme == "bcrypt" and elapsed_ms * 2 > target_ms:
+                break
+        self.context = _build_context(self.scheme, chosen)
+        self._config = self.context.to_string()
+        return chosen
+
+    # --- API synchrone (scripts, compatibilité) ---
+    def hash(self, password: str) -> str:
+        return self.context.hash(password)
+
+    def verify(self, password: str, hashed: str) -> bool:
+        return self.context.verify(password, hashed)
+
+    def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        return self.context.verify_and_update(password, hashed)
+
+    # --- API asynchrone, dans le pool dédié ---
+    async def ahash(self, password: str) -> str:
+        return await self._submit(_hash_in_worker, self._config, password)
+
+    async def averify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """Vérifie ; renvoie aussi un nouveau hash si l'ancien doit être mis à niveau"""
+        return await self._submit(_verify_in_worker, self._config, password, hashed)
+
+    async def _submit(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                raise HashingBusy()
+            self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="hashing")
+        return self._executor
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+hasher = PasswordHasher()
+
 
 class Hash:
     @staticmethod
     def bcrypt(password: str):
-        return pwd_cxt.hash(password)
+        return hasher.hash(password)
 
     @staticmethod
     def verify(hashed_password, plain_password):
-        return pwd_cxt.verify(plain_password, hashed_password)
+        return hasher.verify(plain_password, hashed_password)
@@ -0,0 +1,183 @@
+"""Clés d'idempotence (en-tête Idempotency-Key) pour les POST rejoués par les clients.
+
+La première exécution réserve la clé (ligne `idempotency_keys` sans réponse),
+puis enregistre sa réponse dans la même transaction que ses écritures.
+Les doublons :
+  - pendant l'exécution, dans le même processus : attendent son résultat ;
+  - pendant l'exécution, depuis un autre worker : interrogent la table jusqu'à
+    la réponse (409 au-delà de IDEMPOTENCY_WAIT) ;
+  - ensuite : reçoivent la réponse mémorisée (cache mémoire, sinon table),
+    sans rien réexécuter.
+Une même clé réutilisée avec un autre corps de requête est refusée (422).
+"""
+import asyncio
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, NamedTuple, Optional
+
+from fastapi import HTTPException, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from cache import LRUCache
+from models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", 86400))     # durée de conservation (s)
+IDEMPOTENCY_WAIT = float(os.getenv("IDEMPOTENCY_WAIT", 10))    # attente max d'une requête en cours (s)
+MAX_KEY_LENGTH = 100
+
+
+class StoredResponse(NamedTuple):
+    fingerprint: str
+    status_code: int
+    body: str
+
+
+# réponses récentes (user_id, clé) -> StoredResponse
+response_cache = LRUCache(maxsize=int(os.getenv("IDEMPOTENCY_CACHE_SIZE", 10000)), ttl=IDEMPOTENCY_TTL)
+# exécutions en cours dans ce processus (user_id, clé) -> Future[StoredResponse]
+_in_flight = {}
+
+
+def fingerprint(payload) -> str:
+    return hashlib.sha256(json.dumps(jsonable_encoder(payload), sort_keys=True).encode()).hexdigest()
+
+
+# --- accès à la table (sessions synchrones, via run_sync) ---
+def _load(db: Session, user_id: int, key: str) -> Optional[IdempotencyKey]:
+    return db.scalar(
+        select(IdempotencyKey).where(
+            IdempotencyKey.user_id == user_id,
+            IdempotencyKey.key == key,
+            IdempotencyKey.created_at >= datetime.utcnow() - timedelta(seconds=IDEMPOTENCY_TTL),
+        )
+    )
+
+
+def _claim(db: Session, user_id: int, key: str, request_fingerprint: str) -> bool:
+    """Réserve la clé ; False si une autre requête l'a déjà"""
+    db.execute(
+        delete(IdempotencyKey).where(
+            IdempotencyKey.user_id == user_id,
+            IdempotencyKey.key == key,
+            IdempotencyKey.created_at < datetime.utcnow() - timedelta(seconds=IDEMPOTENCY_TTL),
+        )
+    )
+    dialect = db.get_bind().dialect.name
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    result = db.execute(
+        insert(IdempotencyKey)
+        .values(user_id=user_id, key=key, fingerprint=request_fingerprint, created_at=datetime.utcnow())
+        .on_conflict_do_nothing()
+    )
+    return result.rowcount == 1
+
+
+def _store(db: Session, user_id: int, key: str, status_code: int, body: str) -> None:
+    db.execute(
+        update(IdempotencyKey)
+        .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+        .values(status_code=status_code, response=body)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _release(db: Session, user_id: int, key: str) -> None:
+    db.execute(delete(IdempotencyKey).where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key))
+
+
+def _stored(row: IdempotencyKey) -> Optional[StoredResponse]:
+    if row is None or row.status_code is None:
+        return None
+    return StoredResponse(row.fingerprint, row.status_code, row.response)
+
+
+# --- exécution ---
+def _respond(stored: StoredResponse, request_fingerprint: str, replayed: bool) -> Response:
+    if stored.fingerprint != request_fingerprint:
+        raise HTTPException(status_code=422, detail="Idempotency-Key déjà utilisée pour une autre requête")
+    headers = {REPLAYED_HEADER: "true"} if replayed else {}
+    return Response(stored.body, status_code=stored.status_code, media_type="application/json", headers=headers)
+
+
+async def _wait_for_other_worker(db, user_id: int, key: str) -> StoredResponse:
+    deadline = asyncio.get_running_loop().time() + IDEMPOTENCY_WAIT
+    while asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(0.05)
+        await db.rollback()  # nouvelle transaction : voir les écritures de l'autre worker
+        row = await db.run_sync(_load, user_id, key)
+        if row is None:
+            # l'autre exécution a échoué et libéré la clé : au client de réessayer
+            break
+        stored = _stored(row)
+        if stored:
+            return stored
+    raise HTTPException(status_code=409, detail="Requête identique en cours de traitement, réessayez")
+
+
+async def _execute_once(db, user_id: int, key: str, request_fingerprint: str, execute) -> tuple:
+    stored = _stored(await db.run_sync(_load, user_id, key))
+    if stored:
+        return stored, True
+    claimed = await db.run_sync(_claim, user_id, key, request_fingerprint)
+    await db.commit()
+    if not claimed:
+        return await _wait_for_other_worker(db, user_id, key), True
+
+    try:
+        status_code, body = 200, await execute()
+    except HTTPException as exc:
+        await db.rollback()
+        status_code, body = exc.status_code, {"detail": exc.detail}
+    except BaseException:
+        await db.rollback()
+        await db.run_sync(_release, user_id, key)
+        await db.commit()
+        raise
+    body = json.dumps(jsonable_encoder(body))
+    # réponse enregistrée dans la transaction des écritures de la requête
+    await db.run_sync(_store, user_id, key, status_code, body)
+    await db.commit()
+    return StoredResponse(request_fingerprint, status_code, body), False
+
+
+async def run(db, user_id: int, key: str, payload, execute: Callable[[], Awaitable]) -> Response:
+    """Exécute `execute()` (sans commit) au plus une fois par (utilisateur, clé).
+
+    `execute` renvoie le corps de la réponse ou lève HTTPException ; le commit
+    est fait ici, avec l'enregistrement de la réponse.
+    """
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key invalide (1 à {MAX_KEY_LENGTH} caractères)")
+    request_fingerprint = fingerprint(payload)
+    cache_key = (user_id, key)
+
+    stored = response_cache.get(cache_key)
+    if stored:
+        return _respond(stored, request_fingerprint, replayed=True)
+
+    pending = _in_flight.get(cache_key)
+    if pending is not None:
+        return _respond(await asyncio.shield(pending), request_fingerprint, replayed=True)
+
+    future = asyncio.get_running_loop().create_future()
+    _in_flight[cache_key] = future
+    try:
+        stored, replayed = await _execute_once(db, user_id, key, request_fingerprint, execute)
+    except BaseException as exc:
+        future.set_exception(exc)
+        future.exception()  # évite l'avertissement si personne n'attendait
+        raise
+    else:
+        future.set_result(stored)
+    finally:
+        _in_flight.pop(cache_key, None)
+
+    response_cache.set(cache_key, stored)
+    return _respond(stored, request_fingerprint, replayed=replayed)
@@ -0,0 +1,144 @@
+"""Détecte les requêtes filtrées exécutées sans index (parcours complet de table).
+
+Les requêtes émises pendant un bloc `with capture_queries(engine)` sont
+rejouées avec EXPLAIN :
+  - SQLite : EXPLAIN QUERY PLAN, une ligne « SCAN <table> » sans index ;
+  - PostgreSQL : EXPLAIN avec enable_seqscan=off, un « Seq Scan on <table> »
+    restant signifie qu'aucun index ne peut servir.
+Seuls les parcours d'une table filtrée par un paramètre (`table.colonne = ?`)
+sont signalés : un listage complet, paginé par clé primaire ou un recalcul
+d'agrégats reste légitime.
+
+Usage (depuis backend/) :
+    python index_check.py    # exerce les routes sur une base SQLite temporaire
+"""
+import os
+import re
+import sys
+import tempfile
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import List
+
+from sqlalchemy import event
+
+_SQLITE_SCAN = re.compile(r"^SCAN (\w+)(?: AS (\w+))?$")
+_POSTGRES_SCAN = re.compile(r"Seq Scan on (\w+)(?: (\w+))?")
+
+
+@dataclass
+class FullScan:
+    table: str
+    statement: str
+    plan: List[str] = field(default_factory=list)
+
+
+@contextmanager
+def capture_queries(engine):
+    """Collecte les SELECT/UPDATE/DELETE (distincts) émis sur `engine`"""
+    target = getattr(engine, "sync_engine", engine)
+    captured = {}
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().split(None, 1)[0].upper() in ("SELECT", "UPDATE", "DELETE"):
+            captured.setdefault(statement, parameters)
+
+    event.listen(target, "before_cursor_execute", record)
+    try:
+        yield captured
+    finally:
+        event.remove(target, "before_cursor_execute", record)
+
+
+# colonne (éventuellement dans une fonction) comparée à un paramètre lié
+_PREDICATE = r"\b{}\.\w+\)?\s*(?:=|<>|!=|<=|>=|<|>|\bIN\b|\bI?LIKE\b)\s*\(?\s*(?:\?|%\(\w+\)s|\$\d+|:\w+)"
+
+
+def _filters_on(statement: str, names) -> bool:
+    return any(
+        re.search(_PREDICATE.format(re.escape(name)), statement, re.IGNORECASE)
+        for name in names
+        if name
+    )
+
+
+def explain(conn, statement: str, parameters) -> List[FullScan]:
+    """Parcours complets non justifiés dans le plan de `statement`"""
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        plan = [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+        matches = [_SQLITE_SCAN.match(line.strip()) for line in plan]
+    elif dialect == "postgresql":
+        with conn.begin():
+            conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+            plan = [row[0] for row in conn.exec_driver_sql(f"EXPLAIN {statement}", parameters)]
+        matches = [_POSTGRES_SCAN.search(line) for line in plan]
+    else:
+        raise NotImplementedError(f"dialecte non pris en charge : {dialect}")
+    return [
+        FullScan(table=m.group(1), statement=statement, plan=plan)
+        for m in matches
+        if m and _filters_on(statement, m.groups())
+    ]
+
+
+def check(engine, captured: dict) -> List[FullScan]:
+    target = getattr(engine, "sync_engine", engine)
+    scans = []
+    with target.connect() as conn:
+        for statement, parameters in captured.items():
+            scans.extend(explain(conn, statement, parameters))
+    return scans
+
+
+def exercise(client, admin: dict, user: dict) -> None:
+    """Appelle les routes de lecture/écriture courantes"""
+    client.get("/auth/me", headers=user)
+    client.get("/reservations", headers=user)
+    client.get("/reservations/stats", headers=user)
+    client.get("/tickets/me", headers=user)
+    reservation = client.post(
+        "/reservations",
+        json={"username": "user0", "email": "user0@bench.local", "date": "2024-08-01", "offre": "solo", "quantity": 1},
+        headers=user,
+    ).json()
+    client.post("/payment/simulate", json={"reservation_id": reservation["id"]}, headers=user)
+    client.get(f"/reservations/{reservation['id']}/qrcode", headers=user)
+    page = client.get("/admin/reservations/all?limit=10", headers=admin)
+    cursor = page.headers.get("X-Next-Cursor")
+    if cursor:
+        client.get(f"/admin/reservations/all?limit=10&cursor={cursor}", headers=admin)
+    client.get("/admin/stats", headers=admin)
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(directory, 'index_check.db')}"
+
+    from fastapi.testclient import TestClient
+
+    from benchmarks import seed as seeding
+    from database import engine
+    from main import app
+
+    seeding.seed(engine, users=200, reservations=500, tickets=500, user_tickets=20, unpaid_tickets=20)
+    with TestClient(app) as client:
+        def login(email):
+            res = client.post("/auth/login", json={"email": email, "password": seeding.BENCH_PASSWORD})
+            return {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+        admin, user = login(seeding.ADMIN_EMAIL), login(seeding.USER_EMAIL)
+        with capture_queries(engine) as captured:
+            exercise(client, admin, user)
+
+    scans = check(engine, captured)
+    for scan in scans:
+        print(f"[{scan.table}] {' '.join(scan.statement.split())}")
+        for line in scan.plan:
+            print(f"    {line}")
+    print(f"{len(captured)} requêtes vérifiées, {len(scans)} sans index")
+    sys.exit(1 if scans else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Gestion des places (Offer.capacity) sans survente.
+
+La capacité d'une offre s'applique par date. Elle est répartie sur plusieurs
+lignes `inventory_shards` : chaque réservation décrémente une ligne par un
+UPDATE conditionnel (`remaining >= quantité`), atomique côté base. Deux
+transactions ne peuvent donc jamais vendre la même place. Avec plusieurs
+shards, les acheteurs d'une offre très demandée ne se sérialisent plus sur
+une seule ligne verrouillée.
+
+Les tickets achetés sans réservation datée puisent dans le pool OPEN_DATE.
+Les offres sans capacité (NULL) ne sont pas limitées. Une capacité modifiée
+après coup ne s'applique qu'aux (offre, date) sans shards : les shards déjà
+créés gardent leurs places restantes (les ajuster à la main, ou supprimer
+leurs lignes pour qu'ils soient recréés depuis les ventes en base).
+
+Les shards d'une (offre, date) sont créés à la première vente ou annulation,
+en décomptant les ventes déjà en base : reserve/release doivent donc être
+appelés avant que la ligne réservation/ticket concernée soit écrite. Ordre
+des verrous dans une transaction : compteurs (stats.bump), puis shards, puis
+la ligne elle-même.
+"""
+import os
+import random
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from catalog import OfferInfo
+from models import InventoryShard, Reservation, Ticket
+
+INVENTORY_SHARDS = int(os.getenv("INVENTORY_SHARDS", 8))
+
+# date "pivot" du pool des tickets sans date
+OPEN_DATE = date(1970, 1, 1)
+
+
+class SoldOut(Exception):
+    """Plus assez de places : la transaction en cours doit être annulée"""
+
+
+def reserve(db: Session, offer: OfferInfo, day: date, quantity: int) -> None:
+    """Retire `quantity` places ; lève SoldOut s'il n'y en a pas assez.
+
+    Sur SoldOut, les décréments partiels sont rendus : la transaction reste
+    utilisable (réservations groupées), un rollback reste possible.
+    """
+    if offer.capacity is None or quantity <= 0:
+        return
+    day = day or OPEN_DATE
+    shard_count = _shard_count(offer)
+
+    # cas courant : un seul UPDATE sur un shard tiré au hasard
+    if _take(db, offer.id, day, random.randrange(shard_count), quantity):
+        return
+
+    # shard vide ou trop petit : on répartit sur les shards restants
+    rows = _shards(db, offer.id, day)
+    if not rows:
+        _create_shards(db, offer, day)
+        rows = _shards(db, offer.id, day)
+    need = quantity
+    taken = []
+    for shard, left in rows:
+        take = min(left, need)
+        if take and _take(db, offer.id, day, shard, take):
+            taken.append((shard, take))
+            need -= take
+            if need == 0:
+                return
+    for shard, take in taken:
+        _give(db, offer.id, day, shard, take)
+    raise SoldOut()
+
+
+def release(db: Session, offer: OfferInfo, day: date, quantity: int) -> None:
+    """Rend des places (annulation) sur un shard quelconque"""
+    if offer.capacity is None or quantity <= 0:
+        return
+    day = day or OPEN_DATE
+    if _give(db, offer.id, day, random.randrange(_shard_count(offer)), quantity):
+        return
+    # shards pas encore créés : les places rendues sont encore comptées comme vendues
+    _create_shards(db, offer, day)
+    _give(db, offer.id, day, 0, quantity)
+
+
+def remaining(db: Session, offer: OfferInfo, day: date) -> Optional[int]:
+    """Places restantes (None = offre illimitée)"""
+    if offer.capacity is None:
+        return None
+    day = day or OPEN_DATE
+    rows = _shards(db, offer.id, day)
+    if rows:
+        return sum(left for _, left in rows)
+    return max(0, offer.capacity - _already_sold(db, offer, day))
+
+
+def _shard_count(offer: OfferInfo) -> int:
+    # jamais plus de shards que de places
+    return max(1, min(INVENTORY_SHARDS, offer.capacity or 1))
+
+
+def _take(db: Session, offer_id: int, day: date, shard: int, quantity: int) -> bool:
+    result = db.execute(
+        update(InventoryShard)
+        .where(
+            InventoryShard.offer_id == offer_id,
+            InventoryShard.date == day,
+            InventoryShard.shard == shard,
+            InventoryShard.remaining >= quantity,
+        )
+        .values(remaining=InventoryShard.remaining - quantity)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def _give(db: Session, offer_id: int, day: date, shard: int, quantity: int) -> bool:
+    result = db.execute(
+        update(InventoryShard)
+        .where(
+            InventoryShard.offer_id == offer_id,
+            InventoryShard.date == day,
+            InventoryShard.shard == shard,
+        )
+        .values(remaining=InventoryShard.remaining + quantity)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def _shards(db: Session, offer_id: int, day: date):
+    return db.execute(
+        select(InventoryShard.shard, InventoryShard.remaining)
+        .where(InventoryShard.offer_id == offer_id, InventoryShard.date == day)
+        .order_by(InventoryShard.remaining.desc())
+    ).all()
+
+
+def _already_sold(db: Session, offer: OfferInfo, day: date) -> int:
+    # places vendues avant l'initialisation des shards (données existantes)
+    if day == OPEN_DATE:
+        sold = db.scalar(
+            select(func.count(Ticket.id)).where(Ticket.offer_id == offer.id, Ticket.reservation_id.is_(None))
+        )
+    else:
+        sold = db.scalar(
+            select(func.sum(Reservation.quantity)).where(
+                func.lower(Reservation.offer) == offer.name.lower(), Reservation.date == day
+            )
+        )
+    return sold or 0
+
+
+def _create_shards(db: Session, offer: OfferInfo, day: date) -> None:
+    """Initialise les shards de (offre, date) ; sans effet s'ils existent déjà"""
+    count = _shard_count(offer)
+    base, extra = divmod(max(0, offer.capacity - _already_sold(db, offer, day)), count)
+    rows = [
+        {"offer_id": offer.id, "date": day, "shard": shard, "remaining": base + (1 if shard < extra else 0)}
+        for shard in range(count)
+    ]
+    dialect = db.get_bind().dialect.name
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    db.execute(insert(InventoryShard).values(rows).on_conflict_do_nothing())
+
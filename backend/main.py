@@ -1,16 +1,68 @@
+import time
+
+_import_started = time.perf_counter()
+
+import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+import database
 from database import Base, engine
+from hashing import hasher
 from routers.auth import router as auth_router
 from routers.reservations import router as reservations_router
 from routers.admin import router as admin_router
 from routers.payment import router as payment_router
 from routers.tickets import router as tickets_router
+from routers.offers import router as offers_router
+from routers.gate import router as gate_router
+from catalog import catalog
+from serialization import FastJSONResponse
+import metrics
+from gate import gate_index
+import startup
+import replica
+import admission
+
 
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # rien ne touche la base à l'import : tout se fait ici, chronométré
+    report = startup.StartupReport(_imported_in)
+    if startup.DB_CREATE_ALL:
+        with report.step("schéma"):
+            Base.metadata.create_all(bind=engine)
+    with report.step("hachage"):
+        # ajuste le coût bcrypt/argon2 à PASSWORD_HASH_TARGET_MS (si défini)
+        hasher.calibrate()
+    with report.step("pool"):
+        await database.warm_up_pool()
+    with report.step("catalogue"):
+        with database.SessionLocal() as db:
+            catalog.refresh(db)
+    if os.getenv("GATE_PRELOAD", "0") == "1":
+        # sinon chargé au premier scan
+        with report.step("index des portes"):
+            with database.SessionLocal() as db:
+                gate_index.load(db)
+    report.emit()
 
-app = FastAPI(title="Olympic API", version="1.0.0")
+    yield
+
+    hasher.shutdown()
+    await database.dispose_async_engine()
+
+
+app = FastAPI(
+    title="Olympic API", version="1.0.0", default_response_class=FastJSONResponse, lifespan=lifespan
+)
 
+
+if admission.RATE_LIMIT_ENABLED:
+    # sous CORS : les refus 429/503 restent lisibles par le front
+    app.add_middleware(admission.AdmissionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -22,13 +74,19 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Server-Timing", "Retry-After"],
 )
+if metrics.METRICS_ENABLED:
+    # ajouté en dernier : englobe les autres middlewares
+    app.add_middleware(metrics.MetricsMiddleware)
 
 app.include_router(auth_router)
 app.include_router(reservations_router)
 app.include_router(admin_router)
 app.include_router(payment_router)
 app.include_router(tickets_router)
+app.include_router(offers_router)
+app.include_router(gate_router)
 
 # Routes
 @app.get("/ping", tags=["health"])
@@ -47,3 +105,26 @@ def debug_routes():
         {"path": r.path, "name": r.name, "methods": list(getattr(r, "methods", []))}
         for r in app.router.routes
     ]
+
+
+@app.get("/__debug/pool")
+def debug_pool():
+    # connexions sorties, attente pour obtenir une connexion, usage de l'overflow
+    status = {"primary": database.pool_status(engine)}
+    async_engine = database.get_async_engine_if_started()
+    if async_engine is not None:
+        status["async"] = database.pool_status(async_engine.sync_engine)
+    if database.read_engine is not None:
+        status["replica"] = {**database.pool_status(database.read_engine), **replica.monitor.status()}
+    return status
+
+
+@app.get("/metrics", tags=["health"], response_class=PlainTextResponse)
+def prometheus_metrics():
+    # latence / statuts / requêtes SQL par route (voir metrics.py), admissions sans contrôle
+    body = metrics.registry.render() + admission.render_metrics()
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+
+# durée de l'import de ce module (rapport de démarrage)
+_imported_in = time.perf_counter() - _import_started
@@ -0,0 +1,210 @@
+"""Télémétrie de performance, exposée au format Prometheus sur /metrics.
+
+MetricsMiddleware (ASGI) mesure chaque requête HTTP : latence par route
+(histogramme), requêtes en cours, codes de statut. Les événements du moteur
+SQLAlchemy comptent les requêtes SQL et le temps passé en base pour la
+requête HTTP courante (contextvar, y compris dans le threadpool et en mode
+asynchrone). Chaque réponse porte un en-tête Server-Timing :
+    Server-Timing: app;dur=12.4, db;dur=3.1;desc="5 queries"
+
+Les routes sont identifiées par leur gabarit (/reservations/{reservation_id}),
+jamais par l'URL brute, pour garder un nombre de séries borné.
+
+Configuration : METRICS_ENABLED=0 désactive le middleware.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() in ("1", "true", "yes")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # s
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500, 1000)                           # requêtes SQL
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class RequestStats:
+    """Compteurs SQL d'une requête HTTP"""
+    __slots__ = ("queries", "db_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current() -> Optional[RequestStats]:
+    return _current.get()
+
+
+# --- requêtes SQL : tous les moteurs (synchrones et sync_engine des moteurs async) ---
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - started
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_started"):
+        conn.info["query_started"].pop()
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # dernier : +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Séries en mémoire (un registre par processus)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.queries: Dict[Tuple[str, str], Histogram] = {}
+        self.db_time: Dict[Tuple[str, str], float] = {}
+
+    def observe(self, method: str, route: str, status: int, duration: float, stats: RequestStats) -> None:
+        key = (method, route)
+        with self._lock:
+            self.requests[(method, route, status)] = self.requests.get((method, route, status), 0) + 1
+            self.latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(duration)
+            self.queries.setdefault(key, Histogram(QUERY_BUCKETS)).observe(stats.queries)
+            self.db_time[key] = self.db_time.get(key, 0.0) + stats.db_time
+
+    def reset(self) -> None:
+        with self._lock:
+            self.requests.clear()
+            self.latency.clear()
+            self.queries.clear()
+            self.db_time.clear()
+
+    def render(self) -> str:
+        """Format texte Prometheus (version 0.0.4)"""
+        lines = [
+            "# HELP http_requests_in_flight Requêtes HTTP en cours de traitement",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}",
+            "# HELP http_requests_total Requêtes HTTP par route et code de statut",
+            "# TYPE http_requests_total counter",
+        ]
+        with self._lock:
+            for (method, route, status), value in sorted(self.requests.items()):
+                lines.append(f'http_requests_total{{{_labels(method, route)},status="{status}"}} {value}')
+            _render_histograms(
+                lines, "http_request_duration_seconds", "Latence des requêtes HTTP par route", self.latency
+            )
+            _render_histograms(
+                lines, "http_request_db_queries", "Requêtes SQL par requête HTTP", self.queries
+            )
+            lines += [
+                "# HELP http_request_db_seconds_total Temps passé en base par route",
+                "# TYPE http_request_db_seconds_total counter",
+            ]
+            for (method, route), value in sorted(self.db_time.items()):
+                lines.append(f"http_request_db_seconds_total{{{_labels(method, route)}}} {value:.6f}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(method: str, route: str) -> str:
+    route = route.replace("\\", "\\\\").replace('"', '\\"')
+    return f'method="{method}",route="{route}"'
+
+
+def _render_histograms(lines, name: str, help_text: str, histograms: Dict[Tuple[str, str], Histogram]) -> None:
+    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for (method, route), histogram in sorted(histograms.items()):
+        labels = _labels(method, route)
+        cumulative = 0
+        for bound, count in zip(histogram.bounds + (float("inf"),), histogram.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else f"{bound:g}"
+            lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+        lines.append(f"{name}_sum{{{labels}}} {histogram.sum:.6f}")
+        lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+
+registry = Registry()
+
+
+def _route_template(scope) -> str:
+    """Gabarit de la route servie (l'endpoint est posé dans le scope par le routeur)"""
+    endpoint = scope.get("endpoint")
+    app = scope.get("app")
+    if endpoint is None or app is None:
+        return UNMATCHED_ROUTE
+    templates = getattr(app.state, "route_templates", None)
+    if templates is None:
+        templates = app.state.route_templates = {
+            getattr(route, "endpoint", None): route.path for route in app.router.routes
+        }
+    return templates.get(endpoint, UNMATCHED_ROUTE)
+
+
+def server_timing(duration: float, stats: RequestStats) -> str:
+    return f'app;dur={duration * 1000:.1f}, db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries"'
+
+
+class MetricsMiddleware:
+    """Middleware ASGI pur (pas de BaseHTTPMiddleware : pas de tâche supplémentaire par requête)"""
+
+    def __init__(self, app, registry: Registry = registry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing(time.perf_counter() - started, stats).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        self.registry.in_flight += 1
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            self.registry.in_flight -= 1
+            _current.reset(token)
+            self.registry.observe(
+                scope["method"], _route_template(scope), status, time.perf_counter() - started, stats
+            )
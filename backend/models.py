@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Float, Date
+from sqlalchemy import DDL, Column, Integer, String, Boolean, DateTime, ForeignKey, Float, Date, Index, Text, event, func
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -32,6 +32,11 @@ class Offer(Base):
     # Relations
     tickets = relationship("Ticket", back_populates="offer")
 
+    __table_args__ = (
+        # recherche insensible à la casse depuis le libellé d'une réservation
+        Index("ix_offers_name_lower", func.lower(name)),
+    )
+
 class Reservation(Base):
     __tablename__ = "reservations"
     
@@ -42,11 +47,16 @@ class Reservation(Base):
     offer = Column("offre", String(50)) 
     quantity = Column(Integer)
     status = Column(String(20), default="pending_payment")
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     
     # Relation
     user = relationship("User", back_populates="reservations")
 
+    __table_args__ = (
+        # places déjà vendues d'une offre à une date (initialisation des shards, inventory.py)
+        Index("ix_reservations_offre_lower_date", func.lower(offer), date),
+    )
+
 
 class Ticket(Base):
     __tablename__ = "tickets"
@@ -67,3 +77,85 @@ class Ticket(Base):
     # Relations
     user = relationship("User", back_populates="tickets")
     offer = relationship("Offer", back_populates="tickets")
+
+    __table_args__ = (
+        # tickets d'un utilisateur (filtrés ou non sur is_paid)
+        Index("ix_tickets_user_id_is_paid", user_id, is_paid),
+        # dernier ticket d'une réservation (ORDER BY id DESC LIMIT 1)
+        Index("ix_tickets_reservation_id_id", reservation_id, id),
+        # rafraîchissement incrémental de l'index des portes (tickets payés récemment)
+        Index("ix_tickets_payment_date", payment_date),
+    )
+
+
+class StatCounter(Base):
+    """Compteurs agrégés (dashboard admin), maintenus par les chemins d'écriture"""
+    __tablename__ = "stat_counters"
+
+    name = Column(String(50), primary_key=True)
+    shard = Column(Integer, primary_key=True, default=0)
+    value = Column(Float, nullable=False, default=0.0)
+
+
+class InventoryShard(Base):
+    """Places restantes d'une offre pour une date, réparties sur plusieurs lignes"""
+    __tablename__ = "inventory_shards"
+
+    offer_id = Column(Integer, ForeignKey("offers.id"), primary_key=True)
+    date = Column(Date, primary_key=True)
+    shard = Column(Integer, primary_key=True)
+    remaining = Column(Integer, nullable=False)
+
+
+class IdempotencyKey(Base):
+    """Réponse mémorisée d'une requête envoyée avec l'en-tête Idempotency-Key"""
+    __tablename__ = "idempotency_keys"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    key = Column(String(100), primary_key=True)
+    fingerprint = Column(String(64), nullable=False)  # hash du corps de la requête
+    status_code = Column(Integer, nullable=True)      # NULL = requête en cours
+    response = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class CatalogVersion(Base):
+    """Version des données de référence (offres) : incrémentée à chaque modification"""
+    __tablename__ = "catalog_versions"
+
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+# toute écriture sur offers (ORM, SQL brut, scripts) incrémente la version des offres :
+# triggers créés avec la table (create_all) et par la migration 0007
+_BUMP_OFFERS_VERSION = (
+    "INSERT INTO catalog_versions (name, version) VALUES ('offers', 1)"
+    " ON CONFLICT (name) DO UPDATE SET version = catalog_versions.version + 1"
+)
+OFFERS_VERSION_TRIGGERS = {
+    "sqlite": [
+        f"CREATE TRIGGER IF NOT EXISTS offers_version_{op.lower()} AFTER {op} ON offers"
+        f" BEGIN {_BUMP_OFFERS_VERSION}; END"
+        for op in ("INSERT", "UPDATE", "DELETE")
+    ],
+    "postgresql": [
+        "CREATE OR REPLACE FUNCTION offers_version_bump() RETURNS trigger LANGUAGE plpgsql AS $$"
+        f" BEGIN {_BUMP_OFFERS_VERSION}; RETURN NULL; END $$",
+        "DROP TRIGGER IF EXISTS offers_version ON offers",
+        "CREATE TRIGGER offers_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON offers"
+        " FOR EACH STATEMENT EXECUTE FUNCTION offers_version_bump()",
+    ],
+}
+for _dialect, _statements in OFFERS_VERSION_TRIGGERS.items():
+    for _statement in _statements:
+        event.listen(Offer.__table__, "after_create", DDL(_statement).execute_if(dialect=_dialect))
+
+
+class RevokedTicket(Base):
+    """Billet révoqué (supprimé, remboursé...) : liste poussée aux portes hors ligne"""
+    __tablename__ = "revoked_tickets"
+
+    ticket_id = Column(Integer, primary_key=True)  # sans clé étrangère : le ticket peut être supprimé
+    reason = Column(String(50), nullable=True)
+    revoked_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
@@ -0,0 +1,61 @@
+from typing import Dict, List, Optional, Sequence
+
+from fastapi import HTTPException, Response
+from sqlalchemy import inspect
+
+# Taille de page par défaut / maximale pour les listes paginées par curseur
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# En-tête renvoyé quand une page suivante existe
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def page_limit(cursor: Optional[int], limit: Optional[int]) -> Optional[int]:
+    """Taille de page ; None (liste complète) si l'appelant n'envoie ni limit ni cursor.
+
+    Les clients existants (front compris) lisent ces listes en une fois, sans
+    suivre X-Next-Cursor : ils ne doivent pas recevoir une liste tronquée.
+    """
+    if cursor is None and limit is None:
+        return None
+    return limit or DEFAULT_PAGE_SIZE
+
+
+def keyset(stmt, key_column, cursor: Optional[int], limit: Optional[int]):
+    """Page de `stmt` par ordre décroissant de `key_column`, à partir de `cursor` (exclu) ; tout si limit est None"""
+    if cursor is not None:
+        stmt = stmt.where(key_column < cursor)
+    stmt = stmt.order_by(key_column.desc())
+    return stmt if limit is None else stmt.limit(limit)
+
+
+def set_next_cursor(response: Response, rows: Sequence, limit: Optional[int], key: str = "id") -> Optional[int]:
+    """Pose l'en-tête X-Next-Cursor si la page est pleine (keyset sur `key`)"""
+    if limit is None or len(rows) < limit or not rows:
+        return None
+    last = rows[-1]
+    cursor = last[key] if isinstance(last, dict) else getattr(last, key)
+    response.headers[NEXT_CURSOR_HEADER] = str(cursor)
+    return cursor
+
+
+def model_columns(model) -> Dict[str, object]:
+    """Colonnes d'un modèle, par nom d'attribut (ex. Reservation.offer -> colonne "offre")"""
+    return {attr.key: getattr(model, attr.key) for attr in inspect(model).column_attrs}
+
+
+def select_fields(fields: Optional[str], columns: Dict[str, object], key: str = "id") -> List:
+    """Colonnes à sélectionner pour ?fields=a,b (toutes par défaut) ; la clé de pagination est toujours incluse"""
+    if not fields:
+        return list(columns.values())
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in columns]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Champs inconnus : {', '.join(unknown)} (disponibles : {', '.join(columns)})",
+        )
+    if key not in names:
+        names.insert(0, key)
+    return [columns[name] for name in dict.fromkeys(names)]
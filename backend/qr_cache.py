@@ -0,0 +1,101 @@
+"""Rendu des QR codes avec cache adressé par contenu.
+
+Le payload d'un ticket ne change plus après paiement : l'image rendue est
+identifiée par le hash (format + payload) et conservée dans un LRU mémoire,
+doublé d'un tier disque optionnel (QR_CACHE_DIR) partagé entre workers.
+Ce même hash sert d'ETag fort côté HTTP.
+"""
+import hashlib
+import io
+import os
+import tempfile
+from typing import Optional
+
+from cache import LRUCache
+
+QR_CACHE_SIZE = int(os.getenv("QR_CACHE_SIZE", 2048))
+QR_CACHE_DIR = os.getenv("QR_CACHE_DIR")
+
+# incrémenter si les paramètres de rendu changent (invalide les ETags)
+RENDER_VERSION = 1
+
+MEDIA_TYPES = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+}
+
+_memory = LRUCache(maxsize=QR_CACHE_SIZE)
+
+
+def qr_etag(payload: str, fmt: str = "png") -> str:
+    return hashlib.sha256(f"{RENDER_VERSION}:{fmt}:{payload}".encode()).hexdigest()[:32]
+
+
+def render_qr(payload: str, fmt: str = "png") -> bytes:
+    """Renvoie l'image du QR code (mémoire -> disque -> rendu)"""
+    key = qr_etag(payload, fmt)
+    body = _memory.get(key)
+    if body is not None:
+        return body
+
+    body = _read_disk(key, fmt)
+    if body is None:
+        body = _render(payload, fmt)
+        _write_disk(key, fmt, body)
+    _memory.set(key, body)
+    return body
+
+
+def _render(payload: str, fmt: str) -> bytes:
+    # import différé : qrcode/PIL ne sont chargés que par les workers qui rendent des images
+    import qrcode
+    import qrcode.image.svg
+
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(payload)
+    qr.make(fit=True)
+
+    buf = io.BytesIO()
+    if fmt == "svg":
+        # un seul <path> : sortie compacte, redimensionnable côté client
+        qr.make_image(image_factory=qrcode.image.svg.SvgPathImage).save(buf)
+    else:
+        qr.make_image(fill_color="black", back_color="white").save(buf, format="PNG", optimize=True)
+    return buf.getvalue()
+
+
+def _disk_path(key: str, fmt: str) -> Optional[str]:
+    if not QR_CACHE_DIR:
+        return None
+    return os.path.join(QR_CACHE_DIR, key[:2], f"{key}.{fmt}")
+
+
+def _read_disk(key: str, fmt: str) -> Optional[bytes]:
+    path = _disk_path(key, fmt)
+    if path is None:
+        return None
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _write_disk(key: str, fmt: str, body: bytes) -> None:
+    path = _disk_path(key, fmt)
+    if path is None:
+        return
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # écriture atomique : fichier temporaire puis rename
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(body)
+        os.replace(tmp, path)
+    except OSError:
+        pass  # le tier disque est un bonus : on sert quand même l'image
@@ -0,0 +1,157 @@
+"""QR codes signés, vérifiables par les portes sans accès à la base.
+
+Payload : OLYS.<base64url(données + signature)>, avec des données binaires
+de 20 octets (big-endian) :
+    version (1) | algorithme (1) | ticket_id (8) | offer_id (4)
+    | date de l'épreuve (2, jours depuis 1970, 0 = aucune) | expiration (4, timestamp Unix)
+
+Signature :
+    ed25519  64 octets ; les portes ne détiennent que la clé publique (recommandé)
+    hmac     HMAC-SHA256 tronqué à 16 octets ; les portes doivent détenir le secret
+
+Une porte vérifie la signature et l'expiration localement, puis consulte la
+liste de révocation qui lui est poussée (GET /gate/revocations).
+
+Configuration (variables d'environnement) :
+    QR_SIGNING_KEY   clé privée Ed25519 (32 octets en base64) ou secret HMAC ;
+                     absente : les QR restent au format OLY-{id}-{final_key}
+    QR_SIGNING_ALG   ed25519 (défaut) | hmac
+    QR_SIGNED_TTL    validité d'un billet sans date d'épreuve (jours, défaut : 365)
+"""
+import base64
+import hashlib
+import hmac
+import os
+import struct
+from datetime import date, datetime, timedelta
+from typing import NamedTuple, Optional
+
+QR_SIGNING_KEY = os.getenv("QR_SIGNING_KEY")
+QR_SIGNING_ALG = os.getenv("QR_SIGNING_ALG", "ed25519")
+QR_SIGNED_TTL = int(os.getenv("QR_SIGNED_TTL", 365))
+
+SIGNED_PREFIX = "OLYS."
+FORMAT_VERSION = 1
+_ALGORITHMS = {"hmac": 1, "ed25519": 2}
+_SIGNATURE_SIZES = {"hmac": 16, "ed25519": 64}
+_LAYOUT = struct.Struct(">BBQIHI")
+_EPOCH = date(1970, 1, 1)
+
+
+class InvalidPayload(ValueError):
+    """Payload signé illisible, mal signé ou expiré"""
+
+
+class SignedTicket(NamedTuple):
+    ticket_id: int
+    offer_id: int
+    event_date: Optional[date]
+    expires_at: datetime
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def is_signed(payload: str) -> bool:
+    return (payload or "").startswith(SIGNED_PREFIX)
+
+
+def expiry_for(event_date: Optional[date], issued_at: datetime) -> datetime:
+    """Fin du jour de l'épreuve, sinon QR_SIGNED_TTL jours après l'émission"""
+    if event_date is not None:
+        return datetime.combine(event_date, datetime.min.time()) + timedelta(days=1)
+    return issued_at + timedelta(days=QR_SIGNED_TTL)
+
+
+class QRSigner:
+    def __init__(self, alg: str, private_key: Optional[bytes] = None, public_key: Optional[bytes] = None):
+        if alg not in _ALGORITHMS:
+            raise ValueError(f"algorithme de signature inconnu : {alg}")
+        self.alg = alg
+        self._private = self._public = None
+        if alg == "hmac":
+            self._private = self._public = private_key
+        else:
+            from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
+
+            if private_key is not None:
+                self._private = Ed25519PrivateKey.from_private_bytes(private_key)
+                self._public = self._private.public_key()
+            else:
+                self._public = Ed25519PublicKey.from_public_bytes(public_key)
+
+    @classmethod
+    def from_env(cls) -> Optional["QRSigner"]:
+        if not QR_SIGNING_KEY:
+            return None
+        if QR_SIGNING_ALG == "hmac":
+            return cls("hmac", QR_SIGNING_KEY.encode())
+        return cls(QR_SIGNING_ALG, _b64decode(QR_SIGNING_KEY))
+
+    @classmethod
+    def for_gate(cls, alg: str, public_key: str) -> "QRSigner":
+        """Vérificateur seul, à partir de la clé publiée par GET /gate/keys"""
+        return cls(alg, public_key=_b64decode(public_key))
+
+    def public_key(self) -> Optional[str]:
+        """Clé publique Ed25519 (base64url) ; None pour HMAC (secret partagé)"""
+        if self.alg == "hmac":
+            return None
+        from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+
+        raw = self._public.public_bytes(Encoding.Raw, PublicFormat.Raw)
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    def _signature(self, data: bytes) -> bytes:
+        if self.alg == "hmac":
+            return hmac.new(self._private, data, hashlib.sha256).digest()[:_SIGNATURE_SIZES["hmac"]]
+        return self._private.sign(data)
+
+    def _check(self, data: bytes, signature: bytes) -> bool:
+        if self.alg == "hmac":
+            return hmac.compare_digest(self._signature(data), signature)
+        from cryptography.exceptions import InvalidSignature
+
+        try:
+            self._public.verify(signature, data)
+        except InvalidSignature:
+            return False
+        return True
+
+    def sign(self, ticket_id: int, offer_id: int, event_date: Optional[date], expires_at: datetime) -> str:
+        data = _LAYOUT.pack(
+            FORMAT_VERSION,
+            _ALGORITHMS[self.alg],
+            ticket_id,
+            offer_id or 0,
+            (event_date - _EPOCH).days if event_date else 0,
+            int((expires_at - datetime(1970, 1, 1)).total_seconds()),
+        )
+        return SIGNED_PREFIX + base64.urlsafe_b64encode(data + self._signature(data)).decode().rstrip("=")
+
+    def verify(self, payload: str, now: Optional[datetime] = None) -> SignedTicket:
+        """Contenu d'un payload signé ; InvalidPayload s'il est faux ou expiré"""
+        if not is_signed(payload):
+            raise InvalidPayload("payload non signé")
+        try:
+            raw = _b64decode(payload[len(SIGNED_PREFIX):])
+        except ValueError:
+            raise InvalidPayload("payload illisible")
+        if len(raw) != _LAYOUT.size + _SIGNATURE_SIZES[self.alg]:
+            raise InvalidPayload("longueur incorrecte")
+        data, signature = raw[:_LAYOUT.size], raw[_LAYOUT.size:]
+        version, alg, ticket_id, offer_id, days, expires = _LAYOUT.unpack(data)
+        if version != FORMAT_VERSION or alg != _ALGORITHMS[self.alg]:
+            raise InvalidPayload("version ou algorithme inattendu")
+        if not self._check(data, signature):
+            raise InvalidPayload("signature invalide")
+        expires_at = datetime(1970, 1, 1) + timedelta(seconds=expires)
+        if (now or datetime.utcnow()) >= expires_at:
+            raise InvalidPayload("billet expiré")
+        event_date = _EPOCH + timedelta(days=days) if days else None
+        return SignedTicket(ticket_id, offer_id, event_date, expires_at)
+
+
+# signataire de l'application (None : QR signés désactivés)
+signer = QRSigner.from_env()
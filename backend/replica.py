@@ -0,0 +1,149 @@
+"""Routage des lectures vers un réplica (DATABASE_READ_URL).
+
+Les handlers en lecture seule (listes, stats) prennent leur session via
+`get_read_db` : elle est ouverte sur le réplica, sauf
+  - juste après une écriture du même client (même en-tête Authorization) :
+    ses lectures restent sur le primaire pendant DB_READ_STICKY_SECONDS,
+    pour qu'il relise toujours ce qu'il vient d'écrire ;
+  - si le réplica est injoignable ou en retard de plus de DB_REPLICA_MAX_LAG
+    secondes (sondé au plus toutes les DB_REPLICA_CHECK_INTERVAL secondes).
+Sans réplica configuré, tout va au primaire.
+
+Les écritures sont repérées par les événements de session (INSERT/UPDATE/
+DELETE, flush) et mémorisées au commit, par processus : derrière plusieurs
+workers, garder DB_READ_STICKY_SECONDS au-dessus de DB_REPLICA_MAX_LAG.
+Une écriture sur une session du réplica lève ReadOnlySessionError.
+"""
+import hashlib
+import os
+import time
+from typing import Optional
+
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+import database
+from cache import LRUCache
+
+DB_REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", 5))               # s
+DB_REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", 1))  # s
+DB_READ_STICKY_SECONDS = float(os.getenv("DB_READ_STICKY_SECONDS", 10))
+
+# retard de rejeu ; 0 si tout le WAL reçu est rejoué (ou si ce n'est pas un standby)
+_PG_LAG_SQL = text(
+    "SELECT CASE"
+    " WHEN pg_last_wal_receive_lsn() IS NULL THEN 0"
+    " WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0"
+    " ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+    " END"
+)
+
+
+class ReadOnlySessionError(RuntimeError):
+    pass
+
+
+# clients ayant écrit récemment (empreinte du jeton -> instant du commit)
+recent_writes = LRUCache(maxsize=100_000)
+
+
+def _client_key(client: Optional[str]) -> Optional[str]:
+    return hashlib.sha256(client.encode()).hexdigest() if client else None
+
+
+def mark_write(client: Optional[str]) -> None:
+    key = _client_key(client)
+    if key is not None:
+        recent_writes.set(key, time.monotonic(), ttl=DB_READ_STICKY_SECONDS)
+
+
+def wrote_recently(client: Optional[str]) -> bool:
+    key = _client_key(client)
+    return key is not None and key in recent_writes
+
+
+# --- suivi des écritures (sessions synchrones et sync_session des AsyncSession) ---
+def _guard(session: Session) -> None:
+    if session.info.get("replica"):
+        raise ReadOnlySessionError("Écriture sur une session du réplica en lecture")
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_statement(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _guard(orm_execute_state.session)
+        orm_execute_state.session.info["wrote"] = True
+
+
+@event.listens_for(Session, "before_flush")
+def _track_flush(session, flush_context, instances):
+    if session.new or session.dirty or session.deleted:
+        _guard(session)
+        session.info["wrote"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _remember_writer(session):
+    if session.info.pop("wrote", False):
+        mark_write(session.info.get("client"))
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_write(session):
+    session.info.pop("wrote", None)
+
+
+class ReplicaMonitor:
+    """État du réplica, sondé au plus une fois par DB_REPLICA_CHECK_INTERVAL"""
+
+    def __init__(self):
+        self.checked_at = 0.0
+        self.healthy = False
+        self.lag: Optional[float] = None
+
+    def check(self) -> bool:
+        try:
+            with database.read_engine.connect() as conn:
+                if conn.dialect.name == "postgresql":
+                    self.lag = float(conn.execute(_PG_LAG_SQL).scalar() or 0.0)
+                else:
+                    conn.execute(text("SELECT 1"))
+                    self.lag = 0.0
+        except Exception:
+            self.lag = None
+        self.healthy = self.lag is not None and self.lag <= DB_REPLICA_MAX_LAG
+        return self.healthy
+
+    async def usable(self) -> bool:
+        if database.read_engine is None:
+            return False
+        if time.monotonic() - self.checked_at >= DB_REPLICA_CHECK_INTERVAL:
+            # posé avant le sondage : une seule requête concurrente le déclenche
+            self.checked_at = time.monotonic()
+            await run_in_threadpool(self.check)
+        return self.healthy
+
+    def status(self) -> dict:
+        return {"healthy": self.healthy, "lag": self.lag}
+
+
+monitor = ReplicaMonitor()
+
+
+async def use_replica(request: Request) -> bool:
+    """Vrai si les lectures de cette requête peuvent aller au réplica"""
+    if database.read_engine is None:
+        return False
+    if wrote_recently(request.headers.get("authorization")):
+        return False
+    return await monitor.usable()
+
+
+async def get_read_db(request: Request):
+    """Session pour les handlers en lecture seule (réplica si possible)"""
+    replica = await use_replica(request)
+    async with database.open_session(replica=replica) as db:
+        db.info["client"] = request.headers.get("authorization")
+        yield db
@@ -1,18 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List, Optional
-from datetime import date as date_type
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from datetime import date as date_type, datetime, time, timedelta
 from pydantic import BaseModel
 
-from database import get_db
+from catalog import get_catalog
+from database import get_db, open_session
 from models import User, Reservation, Ticket
-from routers.auth import get_current_user
+import export
+import replica
+import inventory
+import serialization
+import stats
+from pagination import MAX_PAGE_SIZE, keyset, page_limit, set_next_cursor
+from routers.auth import Principal, get_current_user
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
 # --- Guard ---
-def require_admin(user: User = Depends(get_current_user)) -> User:
+async def require_admin(user: Principal = Depends(get_current_user)) -> Principal:
     if not getattr(user, "is_admin", False):
         raise HTTPException(status_code=403, detail="Admin only")
     return user
@@ -27,72 +35,230 @@ class AdminReservationUpdate(BaseModel):
 
 # ---------- STATS ----------
 @router.get("/stats", name="admin_stats")
-def admin_stats(db: Session = Depends(get_db), _: User = Depends(require_admin)):
-    users = db.query(func.count(User.id)).scalar() or 0
-    reservations = db.query(func.count(Reservation.id)).scalar() or 0
-    tickets = db.query(func.count(Ticket.id)).scalar() or 0
-    paid_tickets = db.query(func.count(Ticket.id)).filter(Ticket.is_paid == True).scalar() or 0
-    revenue = db.query(func.coalesce(func.sum(Ticket.amount), 0.0)).filter(Ticket.is_paid == True).scalar() or 0.0
-    return {"users": users, "reservations": reservations, "tickets": tickets,
-            "paid_tickets": paid_tickets, "revenue": float(revenue)}
+async def admin_stats(
+    fresh: bool = Query(False, description="Recalcule depuis les tables au lieu de lire les compteurs"),
+    db: AsyncSession = Depends(replica.get_read_db),
+    _: Principal = Depends(require_admin),
+):
+    if fresh:
+        return await db.run_sync(stats.compute_stats)
+    values = await db.run_sync(stats.read_counters)
+    if values is None:
+        # compteurs jamais initialisés : reconstruits sur le primaire
+        async with open_session() as primary:
+            values = await primary.run_sync(stats.read_stats)
+    return values
+
+
+@router.post("/stats/rebuild", name="admin_stats_rebuild")
+async def admin_stats_rebuild(db: AsyncSession = Depends(get_db), _: Principal = Depends(require_admin)):
+    return await db.run_sync(stats.rebuild_counters)
 
 # ---------- LIST ALL RESERVATIONS ----------
-@router.get("/reservations/all", name="admin_reservations_all")
-def admin_reservations_all(db: Session = Depends(get_db), _: User = Depends(require_admin)) -> List[dict]:
-    rows = (
-        db.query(Reservation, User.username, User.email)
+def _reservations_query():
+    # dernier ticket de chaque réservation : sous-requête corrélée (1 seule requête, pas de N+1)
+    latest_ticket_id = (
+        select(Ticket.id)
+        .where(Ticket.reservation_id == Reservation.id)
+        .order_by(Ticket.id.desc())
+        .limit(1)
+        .correlate(Reservation)
+        .scalar_subquery()
+    )
+    stmt = (
+        select(
+            Reservation.id,
+            Reservation.user_id,
+            User.username,
+            User.email,
+            Reservation.date,
+            Reservation.offer,
+            Reservation.quantity,
+            Reservation.status,
+            Ticket.id.label("ticket_id"),
+            Ticket.is_paid,
+        )
         .join(User, Reservation.user_id == User.id)
-        .order_by(Reservation.id.desc())
-        .all()
+        .outerjoin(Ticket, Ticket.id == latest_ticket_id)
     )
-    out = []
-    for res, username, email in rows:
-        ticket = (
-            db.query(Ticket)
-            .filter(Ticket.reservation_id == res.id)
-            .order_by(Ticket.id.desc())
-            .first()
+    return stmt
+
+
+def _reservations_page_query(cursor: Optional[int], limit: int):
+    return keyset(_reservations_query(), Reservation.id, cursor, limit)
+
+
+def _reservation_row(row) -> dict:
+    return {
+        "id": row.id,
+        "user_id": row.user_id,
+        "username": row.username,
+        "email": row.email,
+        "date": row.date,
+        "offer": row.offer,
+        "quantity": row.quantity,
+        "status": row.status,
+        "ticket_id": row.ticket_id,
+        "paid": bool(row.is_paid),
+    }
+
+
+async def _stream_reservations(cursor: Optional[int], page_size: int, use_replica: bool):
+    # session dédiée : le flux survit à la fin du handler
+    async with open_session(replica=use_replica) as db:
+        yield b"["
+        first = True
+        while True:
+            rows = (await db.execute(_reservations_page_query(cursor, page_size))).all()
+            for row in rows:
+                yield (b"" if first else b",") + serialization.dumps(_reservation_row(row))
+                first = False
+            if len(rows) < page_size:
+                break
+            cursor = rows[-1].id
+        yield b"]"
+
+
+@router.get("/reservations/all", name="admin_reservations_all")
+async def admin_reservations_all(
+    request: Request,
+    response: Response,
+    cursor: Optional[int] = Query(None, description="Renvoie les réservations d'id < cursor"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Sans limit ni cursor : toute la table"),
+    stream: bool = Query(False, description="Diffuse toute la table (à partir du curseur) en JSON"),
+    _: Principal = Depends(require_admin),
+):
+    limit = page_limit(cursor, limit)
+    use_replica = await replica.use_replica(request)
+    if stream or limit is None:
+        # liste complète : diffusée par pages, mémoire bornée
+        return StreamingResponse(
+            _stream_reservations(cursor, limit or MAX_PAGE_SIZE, use_replica), media_type="application/json"
         )
-        out.append({
-            "id": res.id,
-            "user_id": res.user_id,
-            "username": username,
-            "email": email,
-            "date": res.date,
-            "offer": res.offer,
-            "quantity": res.quantity,
-            "status": res.status,
-            "ticket_id": ticket.id if ticket else None,
-            "paid": bool(ticket.is_paid) if ticket else False,
-        })
+
+    async with open_session(replica=use_replica) as db:
+        rows = (await db.execute(_reservations_page_query(cursor, limit))).all()
+    out = [_reservation_row(row) for row in rows]
+    set_next_cursor(response, out, limit)
     return out
 
+# ---------- EXPORTS (CSV / NDJSON) ----------
+RESERVATION_EXPORT_COLUMNS = [
+    "id", "user_id", "username", "email", "date", "offer", "quantity", "status", "ticket_id", "paid",
+]
+# sans final_key / qr_code : les exports ne transportent pas de billets utilisables
+TICKET_EXPORT_COLUMNS = [
+    "id", "user_id", "offer_id", "reservation_id", "is_paid", "payment_status", "payment_date", "amount", "is_used",
+]
+
+
+async def _export_offer(name: str):
+    """Offre du catalogue (nom insensible à la casse) ; 404 si inconnue"""
+    async with open_session() as db:
+        info = (await get_catalog(db)).by_name(name)
+    if info is None:
+        raise HTTPException(status_code=404, detail="Offre introuvable")
+    return info
+
+
+@router.get("/export/reservations", name="admin_export_reservations")
+async def admin_export_reservations(
+    request: Request,
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    date_from: Optional[date_type] = Query(None),
+    date_to: Optional[date_type] = Query(None),
+    offer: Optional[str] = Query(None, description="Libellé de l'offre"),
+    status: Optional[str] = Query(None),
+    paid: Optional[bool] = Query(None, description="Dernier ticket payé ou non"),
+    _: Principal = Depends(require_admin),
+):
+    stmt = _reservations_query().order_by(Reservation.id)
+    if date_from is not None:
+        stmt = stmt.where(Reservation.date >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(Reservation.date <= date_to)
+    if offer is not None:
+        # libellé libre côté réservation : comparé en minuscules (index ix_reservations_offre_lower_date)
+        info = await _export_offer(offer)
+        stmt = stmt.where(func.lower(Reservation.offer) == info.name.lower())
+    if status is not None:
+        stmt = stmt.where(Reservation.status == status)
+    if paid is True:
+        stmt = stmt.where(Ticket.is_paid == True)  # noqa: E712
+    elif paid is False:
+        stmt = stmt.where(or_(Ticket.is_paid.is_(None), Ticket.is_paid == False))  # noqa: E712
+    return export.export_response(
+        stmt, RESERVATION_EXPORT_COLUMNS, format, "reservations", _reservation_row,
+        replica=await replica.use_replica(request),
+    )
+
+
+@router.get("/export/tickets", name="admin_export_tickets")
+async def admin_export_tickets(
+    request: Request,
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    date_from: Optional[date_type] = Query(None, description="Payés à partir de cette date"),
+    date_to: Optional[date_type] = Query(None, description="Payés jusqu'à cette date (incluse)"),
+    offer: Optional[str] = Query(None, description="Libellé de l'offre"),
+    status: Optional[str] = Query(None, description="Statut de paiement (pending, paid...)"),
+    paid: Optional[bool] = Query(None),
+    _: Principal = Depends(require_admin),
+):
+    stmt = select(*(getattr(Ticket, column) for column in TICKET_EXPORT_COLUMNS)).order_by(Ticket.id)
+    if date_from is not None:
+        stmt = stmt.where(Ticket.payment_date >= datetime.combine(date_from, time.min))
+    if date_to is not None:
+        stmt = stmt.where(Ticket.payment_date < datetime.combine(date_to + timedelta(days=1), time.min))
+    if offer is not None:
+        stmt = stmt.where(Ticket.offer_id == (await _export_offer(offer)).id)
+    if status is not None:
+        stmt = stmt.where(Ticket.payment_status == status)
+    if paid is not None:
+        stmt = stmt.where(Ticket.is_paid == paid)
+    return export.export_response(
+        stmt, TICKET_EXPORT_COLUMNS, format, "tickets", replica=await replica.use_replica(request)
+    )
+
 # ---------- UPDATE (PUT) ----------
 @router.put("/reservations/{reservation_id}", name="admin_update_reservation")
-def admin_update_reservation(
+async def admin_update_reservation(
     reservation_id: int,
     payload: AdminReservationUpdate,
-    db: Session = Depends(get_db),
-    _: User = Depends(require_admin),
+    db: AsyncSession = Depends(get_db),
+    _: Principal = Depends(require_admin),
 ):
-    res = db.query(Reservation).filter(Reservation.id == reservation_id).first()
+    res = await db.get(Reservation, reservation_id)
     if not res:
         raise HTTPException(status_code=404, detail="Reservation not found")
-
-    if payload.date is not None:
-        res.date = payload.date
+    before = (res.offer, res.date, res.quantity)
     # prend 'offer' ou 'offre' depuis le front
-    if payload.offer is not None:
-        res.offer = payload.offer
-    if payload.offre is not None:
-        res.offer = payload.offre
-    if payload.quantity is not None:
-        res.quantity = payload.quantity
+    offer = payload.offre if payload.offre is not None else payload.offer
+    after = (
+        offer if offer is not None else res.offer,
+        payload.date if payload.date is not None else res.date,
+        payload.quantity if payload.quantity is not None else res.quantity,
+    )
+
+    # offre, date ou quantité modifiées : on rend les anciennes places et on prend les nouvelles,
+    # avant de modifier la réservation (cf. inventory)
+    if after != before:
+        offers = await get_catalog(db)
+        old_offer = offers.by_name(before[0])
+        new_offer = offers.by_name(after[0])
+        if old_offer:
+            await db.run_sync(inventory.release, old_offer, before[1], before[2])
+        if new_offer:
+            try:
+                await db.run_sync(inventory.reserve, new_offer, after[1], after[2])
+            except inventory.SoldOut:
+                await db.rollback()
+                raise HTTPException(status_code=409, detail="Not enough capacity left for this offer and date")
+
+    res.offer, res.date, res.quantity = after
     if payload.status is not None:
         res.status = payload.status
-
-    db.commit()
-    db.refresh(res)
+    await db.commit()
+    await db.refresh(res)
     return {
         "id": res.id, "user_id": res.user_id, "date": res.date,
         "offer": res.offer, "quantity": res.quantity, "status": res.status,
@@ -100,14 +266,19 @@ def admin_update_reservation(
 
 # ---------- DELETE ----------
 @router.delete("/reservations/{reservation_id}", name="admin_delete_reservation")
-def admin_delete_reservation(
+async def admin_delete_reservation(
     reservation_id: int,
-    db: Session = Depends(get_db),
-    _: User = Depends(require_admin),
+    db: AsyncSession = Depends(get_db),
+    _: Principal = Depends(require_admin),
 ):
-    res = db.query(Reservation).filter(Reservation.id == reservation_id).first()
+    res = await db.get(Reservation, reservation_id)
     if not res:
         raise HTTPException(status_code=404, detail="Reservation not found")
-    db.delete(res)
-    db.commit()
+    offer = (await get_catalog(db)).by_name(res.offer)
+    await db.run_sync(stats.bump, reservations=-1)
+    stats.touch_user(db, res.user_id)
+    if offer:
+        await db.run_sync(inventory.release, offer, res.date, res.quantity)
+    await db.delete(res)
+    await db.commit()
     return {"message": "Reservation deleted"}
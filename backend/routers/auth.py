@@ -1,32 +1,49 @@
+import os
+from dataclasses import dataclass
+
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from passlib.context import CryptContext
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, object_session
 from jose import jwt, JWTError
 from datetime import datetime, timedelta
 from fastapi.security import OAuth2PasswordBearer
 
 import schemas
 import models
+import stats
+from cache import LRUCache
 from database import get_db
+from hashing import hasher, HashingBusy
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 SECRET_KEY = "ton_secret_key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+# Cache des utilisateurs authentifiés (clé = user id porté par le token)
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", 10000))
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", 60))
+
 
 # ----------------- UTILS ----------------- #
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return hasher.verify(plain_password, hashed_password)
 
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return hasher.hash(password)
+
+
+def _hashing_busy() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Service d'authentification surchargé, réessayez",
+        headers={"Retry-After": "1"},
+    )
 
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
@@ -37,32 +54,89 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
 
 
 # ----------------- ROUTES ----------------- #
+# Le hachage tourne dans le pool dédié de `hashing`, sans bloquer la boucle
+# d'événements ni le threadpool partagé.
 @router.post("/register", response_model=schemas.UserOut)
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    existing = db.query(models.User).filter(models.User.email == user.email).first()
+async def register(user: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
+    existing = await db.scalar(select(models.User.id).where(models.User.email == user.email))
     if existing:
         raise HTTPException(status_code=400, detail="Email déjà enregistré")
 
-    hashed_pw = get_password_hash(user.password)
+    try:
+        hashed_pw = await hasher.ahash(user.password)
+    except HashingBusy:
+        raise _hashing_busy()
+
     db_user = models.User(username=user.username, email=user.email, password=hashed_pw)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.run_sync(stats.bump, users=1)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 
 @router.post("/login")
-def login(request: schemas.UserLogin, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.email == request.email).first()
-    if not user or not verify_password(request.password, user.password):
+async def login(request: schemas.UserLogin, db: AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(models.User).where(models.User.email == request.email))
+    if not user:
+        raise HTTPException(status_code=401, detail="Email ou mot de passe incorrect")
+
+    try:
+        valid, new_hash = await hasher.averify_and_update(request.password, user.password)
+    except HashingBusy:
+        raise _hashing_busy()
+    if not valid:
         raise HTTPException(status_code=401, detail="Email ou mot de passe incorrect")
 
-    access_token = create_access_token(data={"sub": user.email})
+    # rehachage transparent (coût recalibré ou changement d'algorithme)
+    if new_hash:
+        user.password = new_hash
+        await db.commit()
+
+    access_token = create_access_token(data={"sub": user.email, "uid": user.id})
     return {"access_token": access_token, "token_type": "bearer"}
 
 
+# ----------------- PRINCIPALS ----------------- #
+@dataclass(frozen=True)
+class Principal:
+    """Vue immuable de l'utilisateur authentifié, partageable entre requêtes"""
+    id: int
+    username: str
+    email: str
+    is_admin: bool
+
+    @classmethod
+    def from_user(cls, user: models.User) -> "Principal":
+        return cls(id=user.id, username=user.username, email=user.email, is_admin=bool(user.is_admin))
+
+
+principal_cache = LRUCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+
+
+def invalidate_principal(user_id: int) -> None:
+    principal_cache.pop(user_id)
+
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _user_changed(mapper, connection, target):
+    # invalidation immédiate + après commit (évite qu'une lecture concurrente
+    # ne remette en cache l'ancienne version entre le flush et le commit)
+    invalidate_principal(target.id)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("changed_users", set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session):
+    for user_id in session.info.pop("changed_users", ()):
+        invalidate_principal(user_id)
+
+
 # ----------------- DEPENDENCY ----------------- #
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> Principal:
     credentials_exception = HTTPException(
         status_code=401,
         detail="Impossible de valider les identifiants",
@@ -71,16 +145,30 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
+        user_id = payload.get("uid")
         if email is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
 
-    user = db.query(models.User).filter(models.User.email == email).first()
-    if user is None:
+    if user_id is not None:
+        principal = principal_cache.get(user_id)
+        if principal is None:
+            user = await db.get(models.User, user_id)
+            if user is not None:
+                principal = Principal.from_user(user)
+                principal_cache.set(user_id, principal)
+    else:
+        # anciens tokens sans "uid" : recherche par email
+        user = await db.scalar(select(models.User).where(models.User.email == email))
+        principal = Principal.from_user(user) if user is not None else None
+        if principal is not None:
+            principal_cache.set(principal.id, principal)
+
+    if principal is None or principal.email != email:
         raise credentials_exception
-    return user
+    return principal
 
 @router.get("/me", response_model=schemas.UserOut)
-def read_users_me(current_user: models.User = Depends(get_current_user)):
+async def read_users_me(current_user: Principal = Depends(get_current_user)):
     return current_user
@@ -0,0 +1,104 @@
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel, Field
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_db
+import gate
+from gate import INVALID, REVOKED, VALID, gate_index
+from routers.admin import require_admin
+from routers.auth import Principal
+import qr_signing
+
+router = APIRouter(prefix="/gate", tags=["gate"])
+
+# nombre maximal de scans envoyés par un terminal en une synchronisation
+MAX_SYNC_SCANS = 5000
+
+class Scan(BaseModel):
+    payload: str
+
+class OfflineScan(BaseModel):
+    payload: str
+    scanned_at: Optional[datetime] = None
+
+class ScanSync(BaseModel):
+    device_id: Optional[str] = None
+    scans: List[OfflineScan] = Field(max_length=MAX_SYNC_SCANS)
+
+class Revocation(BaseModel):
+    ticket_ids: List[int] = Field(min_length=1, max_length=MAX_SYNC_SCANS)
+    reason: Optional[str] = Field(None, max_length=50)
+
+
+async def _validate(db: AsyncSession, payloads: List[str]) -> List[dict]:
+    results = await db.run_sync(gate_index.validate, payloads)
+    await db.commit()
+    gate_index.mark_used(r["ticket_id"] for r in results if r["status"] not in (INVALID, REVOKED))
+    return results
+
+
+@router.post("/scan", summary="Validate and consume a ticket QR payload")
+async def scan_ticket(scan: Scan, db: AsyncSession = Depends(get_db), _: Principal = Depends(require_admin)):
+    result = (await _validate(db, [scan.payload]))[0]
+    return {**result, "valid": result["status"] == VALID}
+
+
+@router.post("/sync", summary="Upload scans buffered by an offline gate device")
+async def sync_scans(batch: ScanSync, db: AsyncSession = Depends(get_db), _: Principal = Depends(require_admin)):
+    # ordre chronologique des scans : le premier passage d'un billet est accepté
+    order = sorted(range(len(batch.scans)), key=lambda i: (batch.scans[i].scanned_at or datetime.max, i))
+    results = await _validate(db, [batch.scans[i].payload for i in order])
+    out = [None] * len(order)
+    for position, index in enumerate(order):
+        out[index] = {"index": index, **results[position]}
+    return {
+        "device_id": batch.device_id,
+        "valid": sum(1 for r in out if r["status"] == VALID),
+        "rejected": sum(1 for r in out if r["status"] != VALID),
+        "results": out,
+    }
+
+
+@router.get("/index", summary="Gate index status")
+async def gate_index_status(_: Principal = Depends(require_admin)):
+    return gate_index.status()
+
+
+@router.post("/index/reload", summary="Reload the in-memory ticket index (gate opening)")
+async def reload_gate_index(db: AsyncSession = Depends(get_db), _: Principal = Depends(require_admin)):
+    return await db.run_sync(gate_index.load)
+
+
+@router.get("/keys", summary="Signed QR verification key for offline gate devices")
+async def signing_key(_: Principal = Depends(require_admin)):
+    signer = qr_signing.signer
+    if signer is None:
+        raise HTTPException(status_code=404, detail="QR signés désactivés (QR_SIGNING_KEY)")
+    return {
+        "format": qr_signing.FORMAT_VERSION,
+        "prefix": qr_signing.SIGNED_PREFIX,
+        "alg": signer.alg,
+        # None en HMAC : le secret est distribué hors API
+        "public_key": signer.public_key(),
+    }
+
+
+@router.get("/revocations", summary="Revoked tickets, pushed to offline gate devices")
+async def list_revocations(
+    since: Optional[datetime] = Query(None, description="Seulement les révocations depuis cette date (incrémental)"),
+    db: AsyncSession = Depends(get_db),
+    _: Principal = Depends(require_admin),
+):
+    # as_of : valeur de `since` pour la synchronisation suivante
+    return {"as_of": datetime.utcnow(), "ticket_ids": await db.run_sync(gate.revocations, since)}
+
+
+@router.post("/revocations", summary="Revoke tickets (refund, fraud...)")
+async def revoke_tickets(payload: Revocation, db: AsyncSession = Depends(get_db), _: Principal = Depends(require_admin)):
+    revoked = await db.run_sync(gate.revoke, payload.ticket_ids, payload.reason)
+    await db.commit()
+    gate_index.mark_revoked(payload.ticket_ids)
+    return {"revoked": len(revoked)}
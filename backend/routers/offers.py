@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Depends, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from catalog import get_catalog
+from database import get_db
+from utils import etag_matches
+
+router = APIRouter(prefix="/offers", tags=["offers"])
+
+
+@router.get("", summary="List active offers (cached catalog, ETag)")
+async def list_offers(request: Request, db: AsyncSession = Depends(get_db)):
+    # corps JSON et ETag précalculés à chaque version du catalogue
+    offers = await get_catalog(db)
+    headers = {"ETag": offers.etag, "Cache-Control": "public, max-age=60"}
+    if etag_matches(request.headers.get("if-none-match"), offers.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(offers.body, media_type="application/json", headers=headers)
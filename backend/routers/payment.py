@@ -1,104 +1,256 @@
 from datetime import datetime
+from typing import List, Optional
 from uuid import uuid4
 
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, Header, HTTPException
+from pydantic import BaseModel, Field
+from sqlalchemy import case, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+from catalog import OfferSnapshot, get_catalog
 from database import get_db
-from models import Ticket, Reservation, User, Offer
-from routers.auth import get_current_user
+from models import Ticket, Reservation
+from routers.auth import Principal, get_current_user
+import idempotency
+import qr_signing
+import stats
 
 router = APIRouter(prefix="/payment", tags=["payment"])
 
+# nombre maximal d'éléments d'un panier
+MAX_CART_ITEMS = 500
+
 class PaymentSimulation(BaseModel):
     ticket_id: int | None = None
     reservation_id: int | None = None
 
-@router.post("/simulate", summary="Simulate Payment (+ QR activation)")
-def simulate_payment(
-    payload: PaymentSimulation,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
-):
-    ticket: Ticket | None = None
+class CartPayment(BaseModel):
+    ticket_ids: List[int] = Field(default_factory=list, max_length=MAX_CART_ITEMS)
+    reservation_ids: List[int] = Field(default_factory=list, max_length=MAX_CART_ITEMS)
 
-    if payload.ticket_id is not None:
-        ticket = (
-            db.query(Ticket)
-            .filter(Ticket.id == payload.ticket_id, Ticket.user_id == user.id)
-            .first()
-        )
-        if not ticket:
-            raise HTTPException(status_code=404, detail="Ticket non trouvé")
 
-    elif payload.reservation_id is not None:
-        # 1) réservation (appartenance)
-        res = (
-            db.query(Reservation)
-            .filter(Reservation.id == payload.reservation_id, Reservation.user_id == user.id)
-            .first()
-        )
-        if not res:
-            raise HTTPException(status_code=404, detail="Reservation not found")
+def _settle(
+    db: Session, user_id: int, ticket_ids: List[int], reservation_ids: List[int], offers: OfferSnapshot
+) -> List[dict]:
+    """Règle des tickets et des réservations d'un utilisateur, en un nombre fixe de requêtes.
+
+    Tickets auto-créés (INSERT multi-lignes) pour les réservations qui n'en ont
+    pas, puis un UPDATE pour tous les tickets et un pour les réservations.
+    Renvoie un résultat par élément demandé (tickets puis réservations).
+    """
+    ticket_ids = list(dict.fromkeys(ticket_ids))
+    reservation_ids = list(dict.fromkeys(reservation_ids))
 
-        # 2) ticket existant lié à la réservation
-        ticket = (
-            db.query(Ticket)
-            .filter(Ticket.reservation_id == res.id, Ticket.user_id == user.id)
+    # 1) tickets demandés (appartenance)
+    tickets = {}
+    if ticket_ids:
+        rows = db.execute(
+            select(
+                Ticket.id, Ticket.offer_id, Ticket.reservation_id, Ticket.final_key, Ticket.qr_code,
+                Ticket.is_paid, Ticket.amount, Reservation.date.label("event_date"),
+            )
+            .outerjoin(Reservation, Reservation.id == Ticket.reservation_id)
+            .where(Ticket.id.in_(ticket_ids), Ticket.user_id == user_id)
+        ).all()
+        tickets = {row.id: row._asdict() for row in rows}
+    owned = set(tickets)
+
+    # 2) réservations demandées + leur dernier ticket, en une requête
+    reservations = {}
+    if reservation_ids:
+        latest_ticket_id = (
+            select(Ticket.id)
+            .where(Ticket.reservation_id == Reservation.id, Ticket.user_id == user_id)
             .order_by(Ticket.id.desc())
-            .first()
+            .limit(1)
+            .correlate(Reservation)
+            .scalar_subquery()
         )
+        rows = db.execute(
+            select(
+                Reservation.id,
+                Reservation.offer,
+                Reservation.date,
+                Ticket.id.label("ticket_id"),
+                Ticket.offer_id,
+                Ticket.final_key,
+                Ticket.qr_code,
+                Ticket.is_paid,
+                Ticket.amount,
+            )
+            .outerjoin(Ticket, Ticket.id == latest_ticket_id)
+            .where(Reservation.id.in_(reservation_ids), Reservation.user_id == user_id)
+        ).all()
+        reservations = {row.id: row for row in rows}
+        for row in rows:
+            if row.ticket_id is not None:
+                tickets.setdefault(row.ticket_id, {
+                    "id": row.ticket_id, "offer_id": row.offer_id, "reservation_id": row.id,
+                    "final_key": row.final_key, "qr_code": row.qr_code, "is_paid": row.is_paid,
+                    "amount": row.amount, "event_date": row.date,
+                })
+
+    # 3) auto-création des tickets manquants
+    missing = [row for row in reservations.values() if row.ticket_id is None]
+    created = 0
+    ticket_of_reservation = {row.id: row.ticket_id for row in reservations.values() if row.ticket_id is not None}
+    if missing:
+        values = [
+            {
+                "user_id": user_id,
+                # fallback offre "Solo" (id=1)
+                "offer_id": offers.by_name(row.offer).id if offers.by_name(row.offer) else 1,
+                "reservation_id": row.id,
+                "is_used": False,
+                "is_paid": False,
+                "payment_status": "pending",
+                "amount": 0.0,
+            }
+            for row in missing
+        ]
+        inserted = db.execute(
+            insert(Ticket).values(values).returning(Ticket.id, Ticket.reservation_id, Ticket.offer_id)
+        ).all()
+        for row in inserted:
+            ticket_of_reservation[row.reservation_id] = row.id
+            tickets[row.id] = {
+                "id": row.id, "offer_id": row.offer_id, "reservation_id": row.reservation_id,
+                "final_key": None, "qr_code": None, "is_paid": False, "amount": 0.0,
+                "event_date": reservations[row.reservation_id].date,
+            }
+        created = len(inserted)
 
-        # 3) auto-création si absent
-        if not ticket:
-            offer = db.query(Offer).filter(Offer.name.ilike(res.offer)).first()
-            offer_id = offer.id if offer else 1  # fallback offre "Solo" (id=1)
-            ticket = Ticket(
-                user_id=user.id,
-                offer_id=offer_id,
-                reservation_id=res.id,
-                final_key=None,
-                qr_code=None,
-                is_used=False,
-                is_paid=False,
-                payment_status="pending",
-                payment_date=None,
-                amount=0.0,
+    # 4) final_key / QR des tickets non payés, puis un seul UPDATE
+    now = datetime.utcnow()
+    signer = qr_signing.signer
+    unpaid = {ticket_id: ticket for ticket_id, ticket in tickets.items() if not ticket["is_paid"]}
+    for ticket in unpaid.values():
+        if not ticket["final_key"]:
+            ticket["final_key"] = f"T{user_id}-{ticket['offer_id']}-{uuid4().hex[:10]}"
+        if signer:
+            # vérifiable hors ligne par les portes (voir qr_signing)
+            expires_at = qr_signing.expiry_for(ticket["event_date"], now)
+            ticket["qr_code"] = signer.sign(ticket["id"], ticket["offer_id"], ticket["event_date"], expires_at)
+        else:
+            ticket["qr_code"] = f"OLY-{ticket['id']}-{ticket['final_key']}"
+    if tickets:
+        # tickets déjà payés (QR émis, éventuellement signé, date de paiement) : inchangés
+        if unpaid:
+            db.execute(
+                update(Ticket)
+                .where(Ticket.id.in_(list(unpaid)), Ticket.is_paid.is_not(True))  # NULL : non payé
+                .values(
+                    is_paid=True,
+                    payment_status="paid",
+                    payment_date=now,
+                    final_key=case({tid: t["final_key"] for tid, t in unpaid.items()}, value=Ticket.id),
+                    qr_code=case({tid: t["qr_code"] for tid, t in unpaid.items()}, value=Ticket.id),
+                )
+                .execution_options(synchronize_session=False)
             )
-            db.add(ticket)
-            db.flush()  # pour obtenir ticket.id sans commit
 
-    else:
-        raise HTTPException(status_code=400, detail="ticket_id ou reservation_id requis")
+        # 5) statut des réservations liées
+        linked = {t["reservation_id"] for t in tickets.values() if t["reservation_id"]}
+        if linked:
+            db.execute(
+                update(Reservation)
+                .where(Reservation.id.in_(linked), Reservation.user_id == user_id)
+                .values(status="confirmed")
+                .execution_options(synchronize_session=False)
+            )
+
+        stats.bump(
+            db,
+            tickets=created,
+            paid_tickets=len(unpaid),
+            revenue=sum(t["amount"] or 0.0 for t in unpaid.values()),
+        )
+        stats.touch_user(db, user_id)
 
-    # 4) marquer payé + final_key + QR payload
-    if not ticket.final_key:
-        ticket.final_key = f"T{user.id}-{ticket.offer_id}-{uuid4().hex[:10]}"
+    def paid(ticket_id):
+        ticket = tickets[ticket_id]
+        return {
+            "status": "ok",
+            "ticket_id": ticket_id,
+            "reservation_id": ticket["reservation_id"],
+            "payment_status": "paid",
+            "paid": True,
+            "qr_payload": ticket["qr_code"],
+            "amount": ticket["amount"],
+            "payment_date": now.isoformat(),
+        }
 
-    ticket.is_paid = True
-    ticket.payment_status = "paid"
-    ticket.payment_date = datetime.utcnow()
+    results = []
+    for ticket_id in ticket_ids:
+        if ticket_id in owned:
+            results.append(paid(ticket_id))
+        else:
+            results.append({"status": "error", "ticket_id": ticket_id, "detail": "Ticket non trouvé"})
+    for reservation_id in reservation_ids:
+        if reservation_id in ticket_of_reservation:
+            results.append(paid(ticket_of_reservation[reservation_id]))
+        else:
+            results.append({"status": "error", "reservation_id": reservation_id, "detail": "Reservation not found"})
+    return results
 
-    qr_payload = f"OLY-{ticket.id}-{ticket.final_key}"
-    ticket.qr_code = qr_payload
 
-    # 5) statut de la réservation liée
-    if ticket.reservation_id:
-        res = db.query(Reservation).filter(Reservation.id == ticket.reservation_id).first()
-        if res and res.user_id == user.id:
-            res.status = "confirmed"
+async def _simulate(db: AsyncSession, user: Principal, payload: PaymentSimulation) -> dict:
+    if payload.ticket_id is not None:
+        results = await db.run_sync(_settle, user.id, [payload.ticket_id], [], await get_catalog(db))
+    elif payload.reservation_id is not None:
+        results = await db.run_sync(_settle, user.id, [], [payload.reservation_id], await get_catalog(db))
+    else:
+        raise HTTPException(status_code=400, detail="ticket_id ou reservation_id requis")
 
-    db.commit()
-    db.refresh(ticket)
+    result = results[0]
+    if result["status"] != "ok":
+        raise HTTPException(status_code=404, detail=result["detail"])
+    return result
 
+
+async def _checkout(db: AsyncSession, user: Principal, payload: CartPayment) -> dict:
+    if not payload.ticket_ids and not payload.reservation_ids:
+        raise HTTPException(status_code=400, detail="ticket_ids ou reservation_ids requis")
+
+    results = await db.run_sync(
+        _settle, user.id, payload.ticket_ids, payload.reservation_ids, await get_catalog(db)
+    )
+    settled = {r["ticket_id"]: r["amount"] or 0.0 for r in results if r["status"] == "ok"}
     return {
-        "status": "ok",
-        "ticket_id": ticket.id,
-        "reservation_id": ticket.reservation_id,
-        "payment_status": ticket.payment_status,
-        "paid": ticket.is_paid,
-        "qr_payload": ticket.qr_code,
-        "amount": ticket.amount,
-        "payment_date": ticket.payment_date.isoformat() if ticket.payment_date else None,
+        "paid": sum(1 for r in results if r["status"] == "ok"),
+        "failed": sum(1 for r in results if r["status"] != "ok"),
+        "total_amount": sum(settled.values()),
+        "results": results,
     }
+
+
+@router.post("/simulate", summary="Simulate Payment (+ QR activation)")
+async def simulate_payment(
+    payload: PaymentSimulation,
+    idempotency_key: Optional[str] = Header(None, alias=idempotency.IDEMPOTENCY_HEADER),
+    db: AsyncSession = Depends(get_db),
+    user: Principal = Depends(get_current_user),
+):
+    # rejeu sûr : une même clé n'est exécutée qu'une fois
+    if idempotency_key is not None:
+        return await idempotency.run(db, user.id, idempotency_key, payload, lambda: _simulate(db, user, payload))
+
+    result = await _simulate(db, user, payload)
+    await db.commit()
+    return result
+
+
+@router.post("/checkout", summary="Pay a cart of tickets/reservations in one transaction")
+async def checkout(
+    payload: CartPayment,
+    idempotency_key: Optional[str] = Header(None, alias=idempotency.IDEMPOTENCY_HEADER),
+    db: AsyncSession = Depends(get_db),
+    user: Principal = Depends(get_current_user),
+):
+    if idempotency_key is not None:
+        return await idempotency.run(db, user.id, idempotency_key, payload, lambda: _checkout(db, user, payload))
+
+    result = await _checkout(db, user, payload)
+    await db.commit()
+    return result
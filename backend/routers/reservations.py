@@ -1,14 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException
+from collections import defaultdict
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from database import get_db
-from pydantic import BaseModel
-from typing import List
+from replica import get_read_db
+from pydantic import BaseModel, Field
+from typing import List, Optional
+import inventory
 import models
-from routers.auth import get_current_user
-from fastapi.responses import StreamingResponse
+import stats
+from catalog import OfferSnapshot, get_catalog
+from pagination import MAX_PAGE_SIZE, keyset, model_columns, page_limit, select_fields
+from routers.auth import Principal, get_current_user
 from datetime import date as date_type
-import io
-import qrcode
+from qr_cache import MEDIA_TYPES, qr_etag, render_qr
+from schemas import ReservationOut
+from serialization import rows_response
+from utils import etag_matches
 
 router = APIRouter()
 
@@ -19,19 +30,42 @@ class ReservationRequest(BaseModel):
     email: str
     date: date_type
     offre: str
-    quantity: int
+    quantity: int = Field(gt=0)
 
 class ReservationUpdate(BaseModel):
-    quantity: int
+    quantity: int = Field(gt=0)
+
+# taille maximale d'un lot de réservations
+MAX_BULK_RESERVATIONS = 500
 
 # ------------------ Endpoints ------------------
 
-@router.post("/reservations")
-def create_reservation(
+async def _get_own_reservation(db: AsyncSession, reservation_id: int, user_id: int) -> models.Reservation:
+    reservation = await db.scalar(
+        select(models.Reservation).where(
+            models.Reservation.id == reservation_id,
+            models.Reservation.user_id == user_id
+        )
+    )
+    if not reservation:
+        raise HTTPException(status_code=404, detail="Réservation introuvable")
+    return reservation
+
+
+def _sold_out() -> HTTPException:
+    return HTTPException(status_code=409, detail="Plus assez de places disponibles pour cette offre à cette date")
+
+
+@router.post("/reservations", response_model=ReservationOut)
+async def create_reservation(
     request: ReservationRequest,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
 ):
+    offer = (await get_catalog(db)).by_name(request.offre)
+    if not offer:
+        raise HTTPException(status_code=404, detail="Offre introuvable")
+
     reservation = models.Reservation(
         user_id=current_user.id,
         date=request.date,
@@ -39,116 +73,224 @@ def create_reservation(
         quantity=request.quantity,
         status="pending_payment"
     )
+    # ordre des verrous : compteurs, places, puis la réservation (cf. inventory)
+    await db.run_sync(stats.bump, reservations=1)
+    stats.touch_user(db, current_user.id)
+    try:
+        await db.run_sync(inventory.reserve, offer, request.date, request.quantity)
+    except inventory.SoldOut:
+        await db.rollback()
+        raise _sold_out()
     db.add(reservation)
-    db.commit()
-    db.refresh(reservation)
+    await db.commit()
+    await db.refresh(reservation)
     return reservation
 
 
-@router.get("/reservations")
-def list_reservations(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+def _create_reservations_bulk(
+    db: Session, user_id: int, requests: List[ReservationRequest], offers: OfferSnapshot
+) -> List[dict]:
+    """Valide et insère un lot de réservations dans la transaction en cours.
+
+    Les places sont retirées par (offre, date) ; si un groupe ne tient pas en
+    entier, ses réservations sont retentées une à une. Les réservations
+    acceptées sont insérées en un seul INSERT multi-lignes ... RETURNING.
+    """
+    results = [None] * len(requests)
+    groups = defaultdict(list)
+    for index, request in enumerate(requests):
+        offer = offers.by_name(request.offre)
+        if offer is None:
+            results[index] = {"index": index, "status": 404, "detail": "Offre introuvable"}
+        else:
+            groups[(offer.id, request.date)].append(index)
+
+    # ordre des verrous : compteurs, places, puis les réservations (cf. inventory) ;
+    # compteur pris pour tout le lot, corrigé sur le même shard après les refus
+    expected = sum(len(indexes) for indexes in groups.values())
+    shard = stats.bump(db, reservations=expected)
+    accepted = []
+    for (offer_id, day), indexes in groups.items():
+        offer = offers.get(offer_id)
+        try:
+            inventory.reserve(db, offer, day, sum(requests[i].quantity for i in indexes))
+            accepted.extend(indexes)
+            continue
+        except inventory.SoldOut:
+            pass
+        for index in indexes:
+            try:
+                inventory.reserve(db, offer, day, requests[index].quantity)
+                accepted.append(index)
+            except inventory.SoldOut:
+                results[index] = {"index": index, "status": 409, "detail": _sold_out().detail}
+
+    stats.bump(db, shard, reservations=len(accepted) - expected)
+    accepted.sort()
+    if accepted:
+        rows = db.execute(
+            insert(models.Reservation)
+            .values([
+                {
+                    "user_id": user_id,
+                    "date": requests[i].date,
+                    "offer": requests[i].offre,
+                    "quantity": requests[i].quantity,
+                    "status": "pending_payment",
+                }
+                for i in accepted
+            ])
+            .returning(
+                models.Reservation.id, models.Reservation.date, models.Reservation.offer, models.Reservation.quantity
+            )
+        ).all()
+        # RETURNING ne garantit pas l'ordre du VALUES : lignes rapprochées par leur contenu
+        # (deux lignes identiques sont interchangeables)
+        ids = defaultdict(list)
+        for row in rows:
+            ids[(row.date, row.offer, row.quantity)].append(row.id)
+        for index in accepted:
+            reservation_id = ids[(requests[index].date, requests[index].offre, requests[index].quantity)].pop(0)
+            results[index] = {"index": index, "status": 201, "id": reservation_id}
+        stats.touch_user(db, user_id)
+    return results
+
+
+@router.post("/reservations/bulk")
+async def create_reservations_bulk(
+    requests: List[ReservationRequest] = Body(min_length=1, max_length=MAX_BULK_RESERVATIONS),
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    return db.query(models.Reservation).filter(models.Reservation.user_id == current_user.id).all()
+    # une seule transaction (et un seul commit) pour tout le lot
+    results = await db.run_sync(_create_reservations_bulk, current_user.id, requests, await get_catalog(db))
+    await db.commit()
+    return {
+        "created": sum(1 for r in results if r["status"] == 201),
+        "failed": sum(1 for r in results if r["status"] != 201),
+        "results": results,
+    }
 
 
-@router.put("/reservations/{reservation_id}")
-def update_reservation(
-    reservation_id: int,
-    update: ReservationUpdate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+RESERVATION_FIELDS = model_columns(models.Reservation)
+
+
+@router.get("/reservations", responses={200: {"model": List[ReservationOut]}})
+async def list_reservations(
+    cursor: Optional[int] = Query(None, description="Renvoie les réservations d'id < cursor"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Sans limit ni cursor : toute la liste"),
+    status: Optional[str] = Query(None),
+    date_from: Optional[date_type] = Query(None),
+    date_to: Optional[date_type] = Query(None),
+    fields: Optional[str] = Query(None, description="Champs à renvoyer, ex. id,date,offer,status"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    reservation = db.query(models.Reservation).filter(
-        models.Reservation.id == reservation_id,
+    # colonnes demandées uniquement, sans hydrater d'objets ORM
+    stmt = select(*select_fields(fields, RESERVATION_FIELDS)).where(
         models.Reservation.user_id == current_user.id
-    ).first()
+    )
+    if status is not None:
+        stmt = stmt.where(models.Reservation.status == status)
+    if date_from is not None:
+        stmt = stmt.where(models.Reservation.date >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(models.Reservation.date <= date_to)
 
-    if not reservation:
-        raise HTTPException(status_code=404, detail="Réservation introuvable")
+    limit = page_limit(cursor, limit)
+    rows = (await db.execute(keyset(stmt, models.Reservation.id, cursor, limit))).all()
+    # colonnes variables (?fields=) : lignes sérialisées directement
+    return rows_response(rows, limit)
+
+
+@router.put("/reservations/{reservation_id}", response_model=ReservationOut)
+async def update_reservation(
+    reservation_id: int,
+    update: ReservationUpdate,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    reservation = await _get_own_reservation(db, reservation_id, current_user.id)
 
+    delta = update.quantity - reservation.quantity
+    offer = (await get_catalog(db)).by_name(reservation.offer)
+    if offer and delta > 0:
+        try:
+            await db.run_sync(inventory.reserve, offer, reservation.date, delta)
+        except inventory.SoldOut:
+            await db.rollback()
+            raise _sold_out()
+    elif offer and delta < 0:
+        await db.run_sync(inventory.release, offer, reservation.date, -delta)
+    # modifiée après les places (cf. inventory)
     reservation.quantity = update.quantity
-    db.commit()
-    db.refresh(reservation)
+    await db.commit()
+    await db.refresh(reservation)
     return reservation
 
 
 @router.delete("/reservations/{reservation_id}")
-def delete_reservation(
+async def delete_reservation(
     reservation_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    reservation = db.query(models.Reservation).filter(
-        models.Reservation.id == reservation_id,
-        models.Reservation.user_id == current_user.id
-    ).first()
+    reservation = await _get_own_reservation(db, reservation_id, current_user.id)
 
-    if not reservation:
-        raise HTTPException(status_code=404, detail="Réservation introuvable")
-
-    db.delete(reservation)
-    db.commit()
+    offer = (await get_catalog(db)).by_name(reservation.offer)
+    await db.run_sync(stats.bump, reservations=-1)
+    stats.touch_user(db, current_user.id)
+    if offer:
+        await db.run_sync(inventory.release, offer, reservation.date, reservation.quantity)
+    await db.delete(reservation)
+    await db.commit()
     return {"message": "Réservation supprimée"}
 
 
 # ----------- QR Code d'une réservation -----------
 @router.get("/reservations/{reservation_id}/qrcode")
-def get_reservation_qrcode(
+async def get_reservation_qrcode(
     reservation_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    request: Request,
+    format: str = Query("png", pattern="^(png|svg)$"),
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    reservation = db.query(models.Reservation).filter(
-        models.Reservation.id == reservation_id,
-        models.Reservation.user_id == current_user.id
+    # réservation (appartenance) + payload de son dernier ticket en une requête
+    row = (
+        await db.execute(
+            select(models.Reservation.id, models.Ticket.qr_code)
+            .outerjoin(models.Ticket, models.Ticket.reservation_id == models.Reservation.id)
+            .where(
+                models.Reservation.id == reservation_id,
+                models.Reservation.user_id == current_user.id
+            )
+            .order_by(models.Ticket.id.desc())
+            .limit(1)
+        )
     ).first()
 
-    if not reservation:
+    if not row:
         raise HTTPException(status_code=404, detail="Réservation introuvable")
 
-    ticket = db.query(models.Ticket).filter(
-        models.Ticket.reservation_id == reservation_id
-    ).first()
-
-    if not ticket or not ticket.qr_code:
+    if not row.qr_code:
         raise HTTPException(status_code=404, detail="QR code introuvable")
 
-    # Générer un PNG à partir du texte stocké dans ticket.qr_code
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(ticket.qr_code)
-    qr.make(fit=True)
+    # ETag fort = hash du contenu : pas de rendu si le client a déjà l'image
+    etag = f'"{qr_etag(row.qr_code, format)}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
 
-    img = qr.make_image(fill_color="black", back_color="white")
-
-    buf = io.BytesIO()
-    img.save(buf, format="PNG")
-    buf.seek(0)
-
-    return StreamingResponse(buf, media_type="image/png")
+    body = await run_in_threadpool(render_qr, row.qr_code, format)
+    return Response(body, media_type=MEDIA_TYPES[format], headers=headers)
 
 
 # ----------- Stats réservations (admin ou user avancé) -----------
 @router.get("/reservations/stats")
-def stats_reservations(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+async def stats_reservations(
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    total_reservations = db.query(models.Reservation).filter(models.Reservation.user_id == current_user.id).count()
-    total_tickets = db.query(models.Ticket).filter(models.Ticket.user_id == current_user.id).count()
-    total_paid = db.query(models.Ticket).filter(
-        models.Ticket.user_id == current_user.id,
-        models.Ticket.is_paid == True
-    ).count()
-
-    return {
-        "reservations": total_reservations,
-        "tickets": total_tickets,
-        "paid_tickets": total_paid
-    }
+    # une requête agrégée au plus ; ensuite servi par le cache (invalidé par les écritures)
+    return await db.run_sync(stats.user_stats, current_user.id)
@@ -1,19 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from datetime import date as date_type, datetime, time, timedelta
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from catalog import get_catalog
 from database import get_db
+from gate import gate_index
+import gate
+import inventory
 import models
-from routers.auth import get_current_user
+import stats
+from replica import get_read_db
+from pagination import MAX_PAGE_SIZE, keyset, model_columns, page_limit, select_fields
+from routers.auth import Principal, get_current_user
+from schemas import TicketOut
+from serialization import rows_response
 
 router = APIRouter()
 
 # --- Créer un ticket ---
-@router.post("/tickets/")
-def create_ticket(
+@router.post("/tickets/", response_model=TicketOut)
+async def create_ticket(
     offer_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    offer = db.query(models.Offer).filter(models.Offer.id == offer_id).first()
+    offer = (await get_catalog(db)).get(offer_id)
     if not offer:
         raise HTTPException(status_code=404, detail="Offer not found")
 
@@ -22,36 +35,84 @@ def create_ticket(
         offer_id=offer.id,
         amount=offer.price
     )
+    # ordre des verrous : compteurs, places, puis le ticket (cf. inventory)
+    await db.run_sync(stats.bump, tickets=1)
+    stats.touch_user(db, current_user.id)
+    # ticket sans réservation : une place du pool non daté de l'offre
+    try:
+        await db.run_sync(inventory.reserve, offer, None, 1)
+    except inventory.SoldOut:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Offer sold out")
     db.add(ticket)
-    db.commit()
-    db.refresh(ticket)
+    await db.commit()
+    await db.refresh(ticket)
     return ticket
 
 
+TICKET_FIELDS = model_columns(models.Ticket)
+
+
 # --- Récupérer les tickets de l'utilisateur connecté ---
-@router.get("/tickets/me")
-def get_my_tickets(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+@router.get("/tickets/me", responses={200: {"model": List[TicketOut]}})
+async def get_my_tickets(
+    cursor: Optional[int] = Query(None, description="Renvoie les tickets d'id < cursor"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Sans limit ni cursor : toute la liste"),
+    paid: Optional[bool] = Query(None),
+    status: Optional[str] = Query(None, description="Statut de paiement (pending, paid...)"),
+    date_from: Optional[date_type] = Query(None, description="Payés à partir de cette date"),
+    date_to: Optional[date_type] = Query(None, description="Payés jusqu'à cette date (incluse)"),
+    fields: Optional[str] = Query(None, description="Champs à renvoyer, ex. id,offer_id,is_paid,qr_code"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    return db.query(models.Ticket).filter(models.Ticket.user_id == current_user.id).all()
+    # colonnes demandées uniquement ; (user_id, is_paid) est indexé
+    stmt = select(*select_fields(fields, TICKET_FIELDS)).where(models.Ticket.user_id == current_user.id)
+    if paid is not None:
+        stmt = stmt.where(models.Ticket.is_paid == paid)
+    if status is not None:
+        stmt = stmt.where(models.Ticket.payment_status == status)
+    if date_from is not None:
+        stmt = stmt.where(models.Ticket.payment_date >= datetime.combine(date_from, time.min))
+    if date_to is not None:
+        stmt = stmt.where(models.Ticket.payment_date < datetime.combine(date_to + timedelta(days=1), time.min))
+
+    limit = page_limit(cursor, limit)
+    rows = (await db.execute(keyset(stmt, models.Ticket.id, cursor, limit))).all()
+    return rows_response(rows, limit)
 
 
 # --- Supprimer un ticket ---
 @router.delete("/tickets/{ticket_id}")
-def delete_ticket(
+async def delete_ticket(
     ticket_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    ticket = db.query(models.Ticket).filter(
-        models.Ticket.id == ticket_id,
-        models.Ticket.user_id == current_user.id
-    ).first()
+    ticket = await db.scalar(
+        select(models.Ticket).where(
+            models.Ticket.id == ticket_id,
+            models.Ticket.user_id == current_user.id
+        )
+    )
 
     if not ticket:
         raise HTTPException(status_code=404, detail="Ticket not found")
 
-    db.delete(ticket)
-    db.commit()
+    # ordre des verrous : compteurs, places, puis le ticket (cf. inventory)
+    if ticket.is_paid:
+        await db.run_sync(stats.bump, tickets=-1, paid_tickets=-1, revenue=-(ticket.amount or 0.0))
+        # son QR (éventuellement signé) ne doit plus ouvrir les portes
+        await db.run_sync(gate.revoke, [ticket_id], "deleted")
+    else:
+        await db.run_sync(stats.bump, tickets=-1)
+    stats.touch_user(db, current_user.id)
+    if ticket.reservation_id is None:
+        offer = (await get_catalog(db)).get(ticket.offer_id)
+        if offer:
+            await db.run_sync(inventory.release, offer, None, 1)
+    await db.delete(ticket)
+    await db.commit()
+    if ticket.is_paid:
+        gate_index.mark_revoked([ticket_id])
     return {"message": "Ticket deleted successfully"}
@@ -1,6 +1,6 @@
-from datetime import datetime, date
-from typing import Optional, List
-from pydantic import BaseModel
+from datetime import datetime, date as date_type
+from typing import Optional
+from pydantic import BaseModel, ConfigDict
 
 # -------------------------------
 # Utilisateurs
@@ -30,7 +30,7 @@ class UserOut(UserBase):  # <- renommé ici
 class ReservationBase(BaseModel):
     username: str
     email: str
-    date: date
+    date: date_type
     offre: str
     quantity: int
 
@@ -49,6 +49,19 @@ class ReservationResponse(ReservationBase):
     class Config:
         from_attributes = True
 
+class ReservationOut(BaseModel):
+    """Réservation telle que renvoyée par l'API (attributs du modèle)"""
+    id: int
+    user_id: Optional[int] = None
+    username: Optional[str] = None
+    email: Optional[str] = None
+    date: Optional[date_type] = None
+    offer: Optional[str] = None
+    quantity: Optional[int] = None
+    status: Optional[str] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
 
 # -------------------------------
 # Tickets
@@ -70,6 +83,22 @@ class TicketResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class TicketOut(BaseModel):
+    """Ticket tel que renvoyé par l'API (attributs du modèle)"""
+    id: int
+    user_id: Optional[int] = None
+    offer_id: Optional[int] = None
+    reservation_id: Optional[int] = None
+    final_key: Optional[str] = None
+    qr_code: Optional[str] = None
+    is_used: Optional[bool] = None
+    is_paid: Optional[bool] = None
+    payment_status: Optional[str] = None
+    payment_date: Optional[datetime] = None
+    amount: Optional[float] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
 
 # -------------------------------
 # Paiement
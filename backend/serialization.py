@@ -0,0 +1,41 @@
+"""Sérialisation JSON des réponses.
+
+FastJSONResponse (classe de réponse par défaut de l'application) encode avec
+orjson : dates, datetimes et dicts sont sérialisés en C, sans passer par
+jsonable_encoder. Sans orjson installé, retour au chemin standard.
+
+Les listes paginées sont renvoyées par `rows_response` directement depuis
+les lignes SQL (Row), sans objets ORM ni validation pydantic ligne à ligne.
+"""
+import json
+from typing import Sequence
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from pagination import set_next_cursor
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dépendance recommandée (requirements.txt)
+    orjson = None
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        # types inconnus d'orjson (Decimal, modèles pydantic...) : encodeur FastAPI
+        return orjson.dumps(content, default=jsonable_encoder, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def rows_response(rows: Sequence, limit: int) -> FastJSONResponse:
+    """Page de lignes SQL sérialisée telle quelle, avec l'en-tête X-Next-Cursor"""
+    out = [row._asdict() for row in rows]
+    response = FastJSONResponse(out)
+    set_next_cursor(response, out, limit)
+    return response
@@ -0,0 +1,47 @@
+"""Démarrage des workers : étapes chronométrées (lifespan) et rapport.
+
+L'import de main ne touche plus la base : schéma, préchauffage du pool et
+caches (catalogue, index des portes) sont initialisés dans le lifespan de
+l'application, et les modules lourds (qrcode/PIL) ne sont importés qu'au
+premier rendu d'image.
+
+Configuration (variables d'environnement) :
+    DB_CREATE_ALL    1 (défaut) : crée les tables manquantes au démarrage ;
+                     0 quand le schéma est géré par Alembic
+    STARTUP_REPORT   1 : affiche la durée de l'import et de chaque étape
+"""
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+DB_CREATE_ALL = os.getenv("DB_CREATE_ALL", "1").lower() in ("1", "true", "yes")
+STARTUP_REPORT = os.getenv("STARTUP_REPORT", "0").lower() in ("1", "true", "yes")
+
+# modules chargés à la demande : ne doivent pas apparaître après le démarrage
+LAZY_MODULES = ("qrcode", "PIL")
+
+
+class StartupReport:
+    def __init__(self, import_seconds: float):
+        self.steps = [("import main", import_seconds)]
+
+    @contextmanager
+    def step(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps.append((name, time.perf_counter() - started))
+
+    def render(self) -> str:
+        lines = ["Démarrage du worker :"]
+        lines += [f"  {name:<20} {seconds * 1000:8.1f} ms" for name, seconds in self.steps]
+        lines.append(f"  {'total':<20} {sum(s for _, s in self.steps) * 1000:8.1f} ms")
+        loaded = [name for name in LAZY_MODULES if name in sys.modules]
+        lines.append(f"  modules différés chargés : {', '.join(loaded) or 'aucun'}")
+        return "\n".join(lines)
+
+    def emit(self) -> None:
+        if STARTUP_REPORT:
+            print(self.render(), file=sys.stderr, flush=True)
@@ -0,0 +1,196 @@
+"""Moteur de statistiques admin.
+
+Les compteurs globaux (utilisateurs, réservations, tickets, tickets payés, CA)
+sont stockés dans la table `stat_counters` et mis à jour de façon incrémentale
+par les chemins d'écriture, dans la même transaction que l'écriture elle-même.
+Chaque compteur est réparti sur plusieurs lignes (shards) pour éviter qu'une
+seule ligne chaude ne sérialise toutes les transactions ; la lecture somme les
+shards, ce qui reste O(1) quelle que soit la taille des tables.
+
+Les stats d'un utilisateur (/reservations/stats) sont calculées en une seule
+requête puis gardées en cache mémoire quelques secondes ; les chemins
+d'écriture appellent `touch_user`, qui les invalide au commit dans ce
+processus (les autres workers attendent l'expiration, USER_STATS_TTL).
+
+Usage :
+    python stats.py check     # compare les compteurs à un recalcul complet
+    python stats.py rebuild   # recalcule les compteurs depuis zéro
+"""
+import os
+import random
+import sys
+from typing import Optional
+
+from sqlalchemy import case, delete, event, func, select, update
+from sqlalchemy.orm import Session
+
+from cache import LRUCache
+from models import StatCounter, Ticket, Reservation, User
+
+COUNTERS = ("users", "reservations", "tickets", "paid_tickets", "revenue")
+COUNTER_SHARDS = int(os.getenv("STATS_COUNTER_SHARDS", 8))
+USER_STATS_CACHE_SIZE = int(os.getenv("USER_STATS_CACHE_SIZE", 10000))
+USER_STATS_TTL = float(os.getenv("USER_STATS_TTL", 5))  # s, borne l'écart entre workers
+
+user_stats_cache = LRUCache(maxsize=USER_STATS_CACHE_SIZE, ttl=USER_STATS_TTL)
+
+
+def compute_stats(db: Session) -> dict:
+    """Recalcule toutes les stats en une seule requête"""
+    paid = Ticket.is_paid == True  # noqa: E712
+    row = db.execute(
+        select(
+            select(func.count(User.id)).scalar_subquery().label("users"),
+            select(func.count(Reservation.id)).scalar_subquery().label("reservations"),
+            select(func.count(Ticket.id)).scalar_subquery().label("tickets"),
+            select(func.count(Ticket.id)).where(paid).scalar_subquery().label("paid_tickets"),
+            select(func.coalesce(func.sum(Ticket.amount), 0.0)).where(paid).scalar_subquery().label("revenue"),
+        )
+    ).one()
+    return _normalize(row._mapping)
+
+
+def read_counters(db: Session) -> Optional[dict]:
+    """Lit les compteurs sans écrire ; None s'ils n'ont jamais été initialisés"""
+    rows = db.execute(
+        select(StatCounter.name, func.sum(StatCounter.value)).group_by(StatCounter.name)
+    ).all()
+    values = dict(rows)
+    if any(name not in values for name in COUNTERS):
+        return None
+    return _normalize(values)
+
+
+def read_stats(db: Session) -> dict:
+    """Lit les compteurs ; les (re)construit s'ils n'ont jamais été initialisés"""
+    values = read_counters(db)
+    if values is None:
+        return rebuild_counters(db)
+    return values
+
+
+def rebuild_counters(db: Session) -> dict:
+    """Remplace les compteurs par un recalcul complet (shard 0 = total)"""
+    stats = compute_stats(db)
+    db.execute(delete(StatCounter))
+    db.add_all(
+        StatCounter(name=name, shard=shard, value=stats[name] if shard == 0 else 0.0)
+        for name in COUNTERS
+        for shard in range(COUNTER_SHARDS)
+    )
+    db.commit()
+    return stats
+
+
+def check_counters(db: Session) -> dict:
+    """Renvoie les écarts {nom: (compteur, réel)} entre compteurs et recalcul"""
+    stored = read_stats(db)
+    actual = compute_stats(db)
+    return {
+        name: (stored[name], actual[name])
+        for name in COUNTERS
+        if abs(stored[name] - actual[name]) > 1e-6
+    }
+
+
+def bump(db: Session, shard: Optional[int] = None, **deltas) -> Optional[int]:
+    """Applique des deltas aux compteurs, dans la transaction en cours (1 UPDATE).
+
+    Renvoie le shard modifié : un second bump sur ce shard ne prend aucun
+    nouveau verrou (correction après coup dans la même transaction).
+    """
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return shard
+    if shard is None:
+        shard = random.randrange(COUNTER_SHARDS)
+    db.execute(
+        update(StatCounter)
+        .where(
+            StatCounter.name.in_(deltas),
+            StatCounter.shard == shard,
+        )
+        .values(value=StatCounter.value + case(deltas, value=StatCounter.name, else_=0.0))
+        .execution_options(synchronize_session=False)
+    )
+    return shard
+
+
+def compute_user_stats(db: Session, user_id: int) -> dict:
+    """Réservations, tickets et tickets payés d'un utilisateur, en une seule requête"""
+    tickets = (
+        select(
+            func.count(Ticket.id).label("tickets"),
+            func.count(case((Ticket.is_paid == True, Ticket.id))).label("paid_tickets"),  # noqa: E712
+        )
+        .where(Ticket.user_id == user_id)
+        .subquery()
+    )
+    row = db.execute(
+        select(
+            select(func.count(Reservation.id))
+            .where(Reservation.user_id == user_id)
+            .scalar_subquery()
+            .label("reservations"),
+            tickets.c.tickets,
+            tickets.c.paid_tickets,
+        )
+    ).one()
+    return {"reservations": row.reservations, "tickets": row.tickets, "paid_tickets": row.paid_tickets}
+
+
+def user_stats(db: Session, user_id: int) -> dict:
+    """Stats de l'utilisateur, depuis le cache si possible"""
+    values = user_stats_cache.get(user_id)
+    if values is None:
+        values = compute_user_stats(db, user_id)
+        # pas de mise en cache d'une lecture du réplica (éventuellement en retard)
+        if not db.info.get("replica"):
+            user_stats_cache.set(user_id, values)
+    return dict(values)
+
+
+def touch_user(db, user_id: int) -> None:
+    """À appeler par les écritures qui changent les stats de `user_id` (transaction en cours)"""
+    # invalidation immédiate + après commit (une lecture concurrente a pu
+    # remettre en cache l'ancienne valeur entre-temps)
+    user_stats_cache.pop(user_id)
+    db.info.setdefault("stats_users", set()).add(user_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_user_stats(session):
+    for user_id in session.info.pop("stats_users", ()):
+        user_stats_cache.pop(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_user_stats(session):
+    session.info.pop("stats_users", None)
+
+
+def _normalize(values) -> dict:
+    out = {name: int(values[name] or 0) for name in COUNTERS if name != "revenue"}
+    out["revenue"] = float(values["revenue"] or 0.0)
+    return out
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "check"
+    db = SessionLocal()
+    try:
+        if command == "rebuild":
+            print("Compteurs reconstruits :", rebuild_counters(db))
+        elif command == "check":
+            drift = check_counters(db)
+            if drift:
+                for name, (stored, actual) in drift.items():
+                    print(f"{name}: compteur={stored} réel={actual}")
+                sys.exit(1)
+            print("Compteurs cohérents")
+        else:
+            sys.exit(f"Commande inconnue : {command} (check | rebuild)")
+    finally:
+        db.close()
@@ -0,0 +1,73 @@
+import sys, os
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# pour trouver database.py
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database
+import admission
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    """Tables créées avant les tests (ASGITransport ne déclenche pas le lifespan de l'application)"""
+    import models  # noqa: F401  (tables déclarées sur Base.metadata)
+    database.Base.metadata.create_all(bind=database.engine)
+
+
+@pytest.fixture(autouse=True, params=["sync", "async"])
+def db_mode(request, monkeypatch):
+    """Chaque test tourne avec les sessions synchrones (threadpool) puis asynchrones"""
+    monkeypatch.setattr(database, "DB_ASYNC", request.param == "async")
+    yield request.param
+    # le pool async est lié à la boucle d'événements du test qui se termine
+    database.reset_async_engine()
+
+
+@pytest.fixture(autouse=True)
+def admission_buckets(monkeypatch):
+    """Seaux de jetons propres à chaque test (jamais ceux d'un serveur de la machine)"""
+    monkeypatch.setattr(admission.controller, "store", admission.MemoryStore())
+
+
+class QueryCounter:
+    """Requêtes SQL émises pendant un bloc `with count_queries()`"""
+
+    def __init__(self):
+        self.statements = []
+
+    def record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+@contextmanager
+def count_queries():
+    # tous les moteurs : synchrone et sync_engine du moteur async
+    counter = QueryCounter()
+    event.listen(Engine, "before_cursor_execute", counter.record)
+    try:
+        yield counter
+    finally:
+        event.remove(Engine, "before_cursor_execute", counter.record)
+
+
+@pytest.fixture
+def query_budget():
+    """`with query_budget(5, "GET /x"): ...` échoue si le bloc dépasse 5 requêtes SQL"""
+
+    @contextmanager
+    def budget(max_queries, label=""):
+        with count_queries() as counter:
+            yield counter
+        if counter.count > max_queries:
+            statements = "\n".join(f"  {' '.join(s.split())[:200]}" for s in counter.statements)
+            pytest.fail(f"{label} : {counter.count} requêtes SQL pour un budget de {max_queries}\n{statements}")
+
+    return budget
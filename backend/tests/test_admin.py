@@ -1,3 +1,5 @@
+import json
+
 import pytest
 from httpx import AsyncClient, ASGITransport
 import sys, os
@@ -64,6 +66,21 @@ async def test_admin_endpoints():
         assert all_res.status_code == 200, all_res.text
         assert any(r["id"] == reservation["id"] for r in all_res.json())
 
+        # 5b) Pagination par curseur + mode streaming
+        page = await ac.get("/admin/reservations/all?limit=1", headers=admin_headers)
+        assert page.status_code == 200, page.text
+        assert len(page.json()) == 1
+        cursor = page.headers.get("X-Next-Cursor")
+        if cursor:
+            next_page = await ac.get(f"/admin/reservations/all?limit=1&cursor={cursor}", headers=admin_headers)
+            assert all(r["id"] < int(cursor) for r in next_page.json())
+        streamed = await ac.get("/admin/reservations/all?stream=true", headers=admin_headers)
+        assert streamed.status_code == 200, streamed.text
+        assert any(r["id"] == reservation["id"] for r in streamed.json())
+        # sans limit ni cursor : toute la table, jamais tronquée à une page
+        assert "X-Next-Cursor" not in all_res.headers
+        assert len(all_res.json()) == len(streamed.json())
+
         # 6) Admin met à jour la réservation
         update_res = await ac.put(
             f"/admin/reservations/{reservation['id']}",
@@ -82,6 +99,11 @@ async def test_admin_endpoints():
         assert "paid_tickets" in stats
         assert "revenue" in stats
 
+        # 7b) Les compteurs incrémentaux correspondent à un recalcul complet
+        fresh_res = await ac.get("/admin/stats?fresh=true", headers=admin_headers)
+        assert fresh_res.status_code == 200, fresh_res.text
+        assert fresh_res.json() == stats
+
 
         # 8) Admin supprime la réservation
         delete_res = await ac.delete(
@@ -89,3 +111,71 @@ async def test_admin_endpoints():
             headers=admin_headers
         )
         assert delete_res.status_code == 200, delete_res.text
+
+
+@pytest.mark.asyncio
+async def test_admin_exports():
+    """Exports CSV / NDJSON diffusés, avec filtres"""
+
+    ADMIN_EMAIL = "contact@jo-paris2024.com"
+    ADMIN_PASSWORD = "France-2026*"
+    test_user = {
+        "username": "export_user",
+        "email": "export_user@example.com",
+        "password": "secret123"
+    }
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        await ac.post("/auth/register", json=test_user)
+        user_login = await ac.post(
+            "/auth/login",
+            json={"email": test_user["email"], "password": test_user["password"]}
+        )
+        user_headers = {"Authorization": f"Bearer {user_login.json()['access_token']}"}
+        admin_login = await ac.post("/auth/login", json={"email": ADMIN_EMAIL, "password": ADMIN_PASSWORD})
+        admin_headers = {"Authorization": f"Bearer {admin_login.json()['access_token']}"}
+
+        bulk = await ac.post(
+            "/reservations/bulk",
+            json=[
+                {"username": test_user["username"], "email": test_user["email"],
+                 "date": "2031-07-0%d" % day, "offre": offre, "quantity": 1}
+                for day, offre in ((1, "Duo"), (2, "Duo"), (3, "duo"))
+            ],
+            headers=user_headers
+        )
+        reservations = [r["id"] for r in bulk.json()["results"]]
+        await ac.post("/payment/checkout", json={"reservation_ids": reservations[:1]}, headers=user_headers)
+
+        assert (await ac.get("/admin/export/reservations", headers=user_headers)).status_code == 403
+
+        csv_res = await ac.get(
+            "/admin/export/reservations?date_from=2031-07-01&date_to=2031-07-03&offer=DUO",
+            headers=admin_headers
+        )
+        assert csv_res.status_code == 200, csv_res.text
+        assert csv_res.headers["content-type"].startswith("text/csv")
+        assert "attachment" in csv_res.headers["content-disposition"]
+        lines = csv_res.text.strip().splitlines()
+        assert lines[0] == "id,user_id,username,email,date,offer,quantity,status,ticket_id,paid"
+        exported = {int(r[0]): r for r in (line.split(",") for line in lines[1:])}
+        assert [exported[rid][4] for rid in reservations] == ["2031-07-01", "2031-07-02", "2031-07-03"]
+        # libellé insensible à la casse, comme le catalogue
+        assert all(r[5].lower() == "duo" for r in exported.values())
+
+        unpaid = await ac.get(
+            "/admin/export/reservations?format=ndjson&paid=false&date_from=2031-07-01&date_to=2031-07-03",
+            headers=admin_headers
+        )
+        assert unpaid.headers["content-type"].startswith("application/x-ndjson")
+        rows = [json.loads(line) for line in unpaid.text.splitlines()]
+        assert reservations[1] in [r["id"] for r in rows] and reservations[0] not in [r["id"] for r in rows]
+
+        tickets = await ac.get("/admin/export/tickets?format=ndjson&paid=true&offer=Duo", headers=admin_headers)
+        paid_rows = [json.loads(line) for line in tickets.text.splitlines()]
+        assert any(r["reservation_id"] == reservations[0] for r in paid_rows)
+        assert all(r["is_paid"] and "final_key" not in r for r in paid_rows)
+
+        for kind in ("reservations", "tickets"):
+            missing = await ac.get(f"/admin/export/{kind}?offer=Inconnue", headers=admin_headers)
+            assert missing.status_code == 404
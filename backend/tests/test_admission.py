@@ -0,0 +1,89 @@
+import pytest
+from httpx import AsyncClient, ASGITransport
+import sys, os
+
+# pour trouver main.py
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import app
+import admission
+
+
+async def _login(ac, name):
+    user = {"username": name, "email": f"{name}@example.com", "password": "secret123"}
+    await ac.post("/auth/register", json=user)
+    login_res = await ac.post("/auth/login", json={"email": user["email"], "password": user["password"]})
+    return {"Authorization": f"Bearer {login_res.json()['access_token']}"}
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_per_user(tmp_path, monkeypatch):
+    """Seau vide : 429 + Retry-After, sans toucher aux autres utilisateurs ni aux autres routes"""
+
+    store = admission.SQLiteStore(str(tmp_path / "admission.db"))
+    monkeypatch.setattr(admission.controller, "store", store)
+    monkeypatch.setitem(admission.controller.limits, "POST /tickets/", admission.RouteLimit(rate=0.01, burst=2))
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        alice = await _login(ac, "admission_alice")
+        bob = await _login(ac, "admission_bob")
+
+        for _ in range(2):
+            assert (await ac.post("/tickets/?offer_id=1", headers=alice)).status_code == 200
+        limited = await ac.post("/tickets/?offer_id=1", headers=alice)
+        assert limited.status_code == 429, limited.text
+        assert 1 <= int(limited.headers["retry-after"]) <= 100
+
+        # autre utilisateur, même IP : seau séparé (celui de l'IP est plus large)
+        assert (await ac.post("/tickets/?offer_id=1", headers=bob)).status_code == 200
+        # routes non limitées
+        assert (await ac.get("/tickets/me", headers=alice)).status_code == 200
+
+    # seaux partagés : un autre worker (autre connexion au même fichier) voit le seau vide
+    other_worker = admission.SQLiteStore(store.path)
+    limit = admission.controller.limits["POST /tickets/"]
+    scope = {"headers": [(b"authorization", alice["Authorization"].encode())], "client": ("127.0.0.1", 1)}
+    assert other_worker.take(admission.controller.buckets("POST /tickets/", limit, scope), admission.time.time()) > 0
+
+
+@pytest.mark.asyncio
+async def test_load_shedding(monkeypatch):
+    """Trop de requêtes en cours : 503 immédiat sur les routes d'écriture, lectures servies"""
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        headers = await _login(ac, "admission_shed")
+
+        monkeypatch.setattr(admission.controller, "max_writes", 0)
+        shed = await ac.post("/tickets/?offer_id=1", headers=headers)
+        assert shed.status_code == 503, shed.text
+        assert shed.headers["retry-after"] == "1"
+        assert (await ac.get("/tickets/me", headers=headers)).status_code == 200
+
+        monkeypatch.setattr(admission.controller, "max_in_flight", 0)
+        assert (await ac.get("/offers")).status_code == 503
+
+    assert admission.controller.in_flight == 0 and admission.controller.writes_in_flight == 0
+
+
+def test_bucket_stores_bounded_and_fail_open(tmp_path, monkeypatch):
+    """Seaux pleins oubliés ; fichier verrouillé : requête admise et comptée"""
+
+    store = admission.MemoryStore()
+    monkeypatch.setattr(store, "PRUNE_EVERY", 2)
+    store.take([("a", 1.0, 2.0)], now=0.0)
+    store.take([("b", 1.0, 2.0)], now=10.0)  # "a" plein depuis t=1 : supprimé
+    assert set(store._buckets) == {"b"}
+
+    path = str(tmp_path / "admission.db")
+    store = admission.SQLiteStore(path)
+    store.reset()
+    other_worker = admission.sqlite3.connect(path, isolation_level=None)
+    other_worker.execute("BEGIN IMMEDIATE")
+    try:
+        assert store.take([("a", 1.0, 1.0)], admission.time.time()) == 0.0
+    finally:
+        other_worker.execute("ROLLBACK")
+        other_worker.close()
+    assert store.fail_open == 1
+
+    monkeypatch.setattr(admission.controller, "store", store)
+    assert "admission_fail_open_total 1" in admission.render_metrics()
@@ -52,3 +52,47 @@ async def test_login_user():
     data = response.json()
     assert "access_token" in data
     assert data["token_type"] == "bearer"
+
+
+@pytest.mark.asyncio
+async def test_me_cached_principal():
+    """Le token porte l'id utilisateur et /auth/me reste cohérent d'un appel à l'autre"""
+    from jose import jwt
+    from routers.auth import SECRET_KEY, ALGORITHM, principal_cache
+
+    user = make_test_user()
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        created = await ac.post("/auth/register", json=user)
+        login = await ac.post("/auth/login", json={"email": user["email"], "password": user["password"]})
+        token = login.json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        assert jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])["uid"] == created.json()["id"]
+
+        first = await ac.get("/auth/me", headers=headers)
+        assert first.status_code == 200, first.text
+        assert created.json()["id"] in principal_cache
+        second = await ac.get("/auth/me", headers=headers)
+        assert second.json() == first.json()
+
+
+@pytest.mark.asyncio
+async def test_hasher_backpressure_and_rehash():
+    """Le pool de hachage refuse au-delà de sa file et signale les hash à mettre à niveau"""
+    import asyncio
+    from hashing import PasswordHasher, HashingBusy, _build_context
+
+    hasher = PasswordHasher(workers=1, max_queue=0)
+    try:
+        results = await asyncio.gather(
+            hasher.ahash("a"), hasher.ahash("b"), return_exceptions=True
+        )
+        assert sum(isinstance(r, HashingBusy) for r in results) == 1
+
+        old_hash = _build_context("bcrypt", 4).hash("secret123")
+        hasher.context = _build_context("bcrypt", 10)
+        hasher._config = hasher.context.to_string()
+        valid, new_hash = await hasher.averify_and_update("secret123", old_hash)
+        assert valid and new_hash and new_hash.startswith("$2b$10$")
+    finally:
+        hasher.shutdown()
@@ -0,0 +1,139 @@
+import pytest
+from httpx import AsyncClient, ASGITransport
+import sys, os
+
+# pour trouver main.py
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import app
+import qr_signing
+
+ADMIN_EMAIL = "contact@jo-paris2024.com"
+ADMIN_PASSWORD = "France-2026*"
+
+
+@pytest.mark.asyncio
+async def test_gate_scan():
+    """Scan aux portes : billet valide, rejeu, payload forgé, synchronisation hors ligne"""
+
+    test_user = {
+        "username": "gate_user",
+        "email": "gate_user@example.com",
+        "password": "secret123"
+    }
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        await ac.post("/auth/register", json=test_user)
+        login_res = await ac.post(
+            "/auth/login",
+            json={"email": test_user["email"], "password": test_user["password"]}
+        )
+        headers = {"Authorization": f"Bearer {login_res.json()['access_token']}"}
+        admin_login = await ac.post("/auth/login", json={"email": ADMIN_EMAIL, "password": ADMIN_PASSWORD})
+        assert admin_login.status_code == 200, admin_login.text
+        admin_headers = {"Authorization": f"Bearer {admin_login.json()['access_token']}"}
+
+        tickets = [(await ac.post("/tickets/?offer_id=1", headers=headers)).json()["id"] for _ in range(3)]
+        cart = (await ac.post("/payment/checkout", json={"ticket_ids": tickets}, headers=headers)).json()
+        payloads = [r["qr_payload"] for r in cart["results"]]
+
+        # ouverture des portes : chargement de l'index
+        reload_res = await ac.post("/gate/index/reload", headers=admin_headers)
+        assert reload_res.status_code == 200, reload_res.text
+        assert reload_res.json()["tickets"] >= 3
+
+        # utilisateur normal refusé
+        assert (await ac.post("/gate/scan", json={"payload": payloads[0]}, headers=headers)).status_code == 403
+
+        scan = await ac.post("/gate/scan", json={"payload": payloads[0]}, headers=admin_headers)
+        assert scan.status_code == 200, scan.text
+        assert scan.json() == {"status": "valid", "ticket_id": tickets[0], "valid": True}
+
+        rescan = await ac.post("/gate/scan", json={"payload": payloads[0]}, headers=admin_headers)
+        assert rescan.json()["status"] == "replay"
+
+        forged = f"OLY-{tickets[1]}-T0-1-0000000000"
+        for payload in (forged, "n'importe quoi"):
+            res = await ac.post("/gate/scan", json={"payload": payload}, headers=admin_headers)
+            assert res.json()["status"] == "invalid" and res.json()["valid"] is False
+
+        # terminal hors ligne : le premier passage (chronologique) l'emporte
+        sync_res = await ac.post(
+            "/gate/sync",
+            json={"device_id": "porte-3", "scans": [
+                {"payload": payloads[1], "scanned_at": "2024-08-01T10:05:00"},
+                {"payload": payloads[1], "scanned_at": "2024-08-01T10:00:00"},
+                {"payload": payloads[2], "scanned_at": "2024-08-01T10:01:00"},
+                {"payload": payloads[0], "scanned_at": "2024-08-01T10:02:00"},
+                {"payload": forged},
+            ]},
+            headers=admin_headers
+        )
+        assert sync_res.status_code == 200, sync_res.text
+        sync = sync_res.json()
+        assert [r["status"] for r in sync["results"]] == ["replay", "valid", "valid", "replay", "invalid"]
+        assert sync["valid"] == 2 and sync["rejected"] == 3
+
+        my_tickets = (await ac.get("/tickets/me?fields=is_used", headers=headers)).json()
+        assert all(t["is_used"] for t in my_tickets if t["id"] in tickets)
+
+
+@pytest.mark.asyncio
+async def test_gate_signed_qr(monkeypatch):
+    """QR signés : vérification locale (clé publique), révocation, payload altéré"""
+
+    monkeypatch.setattr(qr_signing, "signer", qr_signing.QRSigner("ed25519", os.urandom(32)))
+    test_user = {
+        "username": "gate_signed_user",
+        "email": "gate_signed_user@example.com",
+        "password": "secret123"
+    }
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        await ac.post("/auth/register", json=test_user)
+        login_res = await ac.post(
+            "/auth/login",
+            json={"email": test_user["email"], "password": test_user["password"]}
+        )
+        headers = {"Authorization": f"Bearer {login_res.json()['access_token']}"}
+        admin_login = await ac.post("/auth/login", json={"email": ADMIN_EMAIL, "password": ADMIN_PASSWORD})
+        admin_headers = {"Authorization": f"Bearer {admin_login.json()['access_token']}"}
+
+        reservation = (await ac.post(
+            "/reservations",
+            json={"username": test_user["username"], "email": test_user["email"],
+                  "date": "2030-08-01", "offre": "Solo", "quantity": 1},
+            headers=headers
+        )).json()
+        ticket_id = (await ac.post("/tickets/?offer_id=1", headers=headers)).json()["id"]
+        cart = (await ac.post(
+            "/payment/checkout",
+            json={"ticket_ids": [ticket_id], "reservation_ids": [reservation["id"]]},
+            headers=headers
+        )).json()
+        undated, dated = [r["qr_payload"] for r in cart["results"]]
+        assert dated.startswith(qr_signing.SIGNED_PREFIX)
+
+        # côté porte : clé publique seule, aucune requête
+        keys = (await ac.get("/gate/keys", headers=admin_headers)).json()
+        assert keys["alg"] == "ed25519"
+        verifier = qr_signing.QRSigner.for_gate(keys["alg"], keys["public_key"])
+        content = verifier.verify(dated)
+        assert content.ticket_id == cart["results"][1]["ticket_id"]
+        assert str(content.event_date) == "2030-08-01"
+        with pytest.raises(qr_signing.InvalidPayload):
+            verifier.verify(dated, now=content.expires_at)
+        tampered = dated[:-2] + ("AA" if not dated.endswith("AA") else "BB")
+        with pytest.raises(qr_signing.InvalidPayload):
+            verifier.verify(tampered)
+
+        scan = await ac.post("/gate/scan", json={"payload": dated}, headers=admin_headers)
+        assert scan.json()["status"] == "valid", scan.text
+        assert (await ac.post("/gate/scan", json={"payload": tampered}, headers=admin_headers)).json()["status"] == "invalid"
+
+        # billet supprimé : révoqué, et publié aux portes
+        before = (await ac.get("/gate/revocations", headers=admin_headers)).json()["as_of"]
+        assert (await ac.delete(f"/tickets/{ticket_id}", headers=headers)).status_code == 200
+        revocations = (await ac.get(f"/gate/revocations?since={before}", headers=admin_headers)).json()
+        assert revocations["ticket_ids"] == [ticket_id]
+        revoked_scan = await ac.post("/gate/scan", json={"payload": undated}, headers=admin_headers)
+        assert revoked_scan.json()["status"] == "revoked"
@@ -0,0 +1,53 @@
+import sys, os
+
+import pytest
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session
+
+# pour trouver index_check.py
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import catalog
+import database
+import index_check
+import models
+from routers.admin import _reservations_page_query
+
+
+@pytest.fixture
+def sqlite_engine(tmp_path):
+    engine = database.make_engine(f"sqlite:///{tmp_path / 'indexes.db'}")
+    database.Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+def _run_hot_queries(engine):
+    with Session(engine) as db:
+        db.scalars(select(models.Reservation).where(models.Reservation.user_id == 1)).all()
+        db.scalars(select(models.Ticket).where(models.Ticket.user_id == 1)).all()
+        db.scalar(
+            select(func.count()).select_from(models.Ticket)
+            .where(models.Ticket.user_id == 1, models.Ticket.is_paid == True)  # noqa: E712
+        )
+        db.execute(_reservations_page_query(None, 10)).all()
+        db.execute(_reservations_page_query(100, 10)).all()
+        catalog.OfferCatalog().refresh(db)
+
+
+def test_hot_queries_use_indexes(sqlite_engine):
+    with index_check.capture_queries(sqlite_engine) as captured:
+        _run_hot_queries(sqlite_engine)
+
+    assert captured
+    assert index_check.check(sqlite_engine, captured) == []
+
+
+def test_missing_index_is_reported(sqlite_engine):
+    with sqlite_engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_reservations_user_id"))
+
+    with index_check.capture_queries(sqlite_engine) as captured:
+        _run_hot_queries(sqlite_engine)
+
+    scans = index_check.check(sqlite_engine, captured)
+    assert [scan.table for scan in scans] == ["reservations"]
@@ -0,0 +1,127 @@
+import sys, os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+# pour trouver inventory.py
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database
+import inventory
+import models
+
+
+@pytest.fixture
+def sqlite_session(tmp_path):
+    """Base SQLite fichier isolée (plusieurs connexions concurrentes)"""
+    engine = database.make_engine(f"sqlite:///{tmp_path / 'inventory.db'}")
+    database.Base.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine, expire_on_commit=False)
+    engine.dispose()
+
+
+def test_no_oversell_under_contention(sqlite_session):
+    """Des centaines d'achats concurrents sur une offre ne dépassent jamais sa capacité"""
+    capacity = 150
+    day = date(2024, 8, 1)
+    with sqlite_session() as db:
+        db.add(models.Offer(id=1, name="Solo", price=25.0, capacity=capacity, is_active=True))
+        db.commit()
+
+    sold = []
+    sold_lock = threading.Lock()
+
+    def buy(quantity):
+        with sqlite_session() as db:
+            offer = db.get(models.Offer, 1)
+            try:
+                inventory.reserve(db, offer, day, quantity)
+            except inventory.SoldOut:
+                db.rollback()
+                return
+            db.commit()
+        with sold_lock:
+            sold.append(quantity)
+
+    quantities = [random.randint(1, 4) for _ in range(400)]
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        list(pool.map(buy, quantities))
+
+    with sqlite_session() as db:
+        offer = db.get(models.Offer, 1)
+        left = inventory.remaining(db, offer, day)
+        shards = db.query(models.InventoryShard).all()
+
+    assert sum(sold) <= capacity
+    assert sum(sold) + left == capacity
+    assert all(s.remaining >= 0 for s in shards)
+    # la demande (≈1000 places) dépasse la capacité : tout doit être vendu
+    assert left < 4
+
+
+def test_release_and_existing_sales(sqlite_session):
+    """Les annulations rendent les places ; les ventes antérieures sont décomptées"""
+    day = date(2024, 8, 2)
+    with sqlite_session() as db:
+        db.add(models.Offer(id=1, name="Duo", price=50.0, capacity=10, is_active=True))
+        db.add(models.Reservation(date=day, offer="duo", quantity=6, status="confirmed"))
+        db.commit()
+
+        offer = db.get(models.Offer, 1)
+        assert inventory.remaining(db, offer, day) == 4
+        inventory.reserve(db, offer, day, 4)
+        db.commit()
+        assert inventory.remaining(db, offer, day) == 0
+
+        with pytest.raises(inventory.SoldOut):
+            inventory.reserve(db, offer, day, 1)
+        db.rollback()
+
+        inventory.release(db, offer, day, 2)
+        db.commit()
+        inventory.reserve(db, offer, day, 2)
+        db.commit()
+        assert inventory.remaining(db, offer, day) == 0
+
+
+def test_release_before_shards_exist(sqlite_session):
+    """Annulation avant toute vente : les shards décomptent la réservation encore en base"""
+    day = date(2024, 8, 4)
+    with sqlite_session() as db:
+        db.add(models.Offer(id=1, name="Duo", price=50.0, capacity=10, is_active=True))
+        db.add(models.Reservation(date=day, offer="Duo", quantity=6, status="confirmed"))
+        db.commit()
+
+        offer = db.get(models.Offer, 1)
+        inventory.release(db, offer, day, 2)
+        db.commit()
+        assert inventory.remaining(db, offer, day) == 6
+
+
+def test_bulk_reservations_partial(sqlite_session):
+    """Un lot trop gros pour une date est retenté réservation par réservation"""
+    from catalog import OfferCatalog
+    from routers.reservations import ReservationRequest, _create_reservations_bulk
+
+    day = date(2024, 8, 3)
+    with sqlite_session() as db:
+        db.add(models.Offer(id=1, name="Solo", price=25.0, capacity=5, is_active=True))
+        db.commit()
+
+        item = dict(username="agence", email="agence@example.com", date=day)
+        requests = [
+            ReservationRequest(offre="Solo", quantity=3, **item),
+            ReservationRequest(offre="Inconnue", quantity=1, **item),
+            ReservationRequest(offre="solo", quantity=3, **item),
+            ReservationRequest(offre="Solo", quantity=2, **item),
+        ]
+        results = _create_reservations_bulk(db, None, requests, OfferCatalog().refresh(db))
+        db.commit()
+
+        assert [r["status"] for r in results] == [201, 404, 409, 201]
+        assert inventory.remaining(db, db.get(models.Offer, 1), day) == 0
+        ids = {r["id"] for r in results if r["status"] == 201}
+        assert {r.id for r in db.query(models.Reservation).all()} == ids
@@ -0,0 +1,43 @@
+import re
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+import sys, os
+
+# pour trouver main.py
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import app
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint():
+    """En-tête Server-Timing et séries Prometheus par gabarit de route"""
+
+    test_user = {
+        "username": "metrics_user",
+        "email": "metrics_user@example.com",
+        "password": "secret123"
+    }
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        await ac.post("/auth/register", json=test_user)
+        login_res = await ac.post(
+            "/auth/login",
+            json={"email": test_user["email"], "password": test_user["password"]}
+        )
+        headers = {"Authorization": f"Bearer {login_res.json()['access_token']}"}
+
+        res = await ac.get("/reservations", headers=headers)
+        timing = res.headers["server-timing"]
+        assert re.fullmatch(r'app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries"', timing), timing
+        assert int(re.search(r"(\d+) queries", timing).group(1)) >= 1
+
+        missing = await ac.get("/reservations/999999/qrcode", headers=headers)
+        assert missing.status_code == 404
+
+        body = (await ac.get("/metrics")).text
+        assert "# TYPE http_request_duration_seconds histogram" in body
+        assert re.search(r'http_requests_total\{method="GET",route="/reservations",status="200"\} \d+', body)
+        assert 'route="/reservations/{reservation_id}/qrcode",status="404"' in body
+        assert re.search(r'http_request_db_queries_bucket\{method="GET",route="/reservations",le="\+Inf"\} \d+', body)
+        assert "/reservations/999999" not in body
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import select, update
+import sys, os
+
+# pour trouver main.py
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import app
+import database
+import models
+
+
+@pytest.mark.asyncio
+async def test_offers_catalog():
+    """Liste des offres (catalogue en mémoire) + ETag, rechargée quand une offre change"""
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        offers_res = await ac.get("/offers")
+        assert offers_res.status_code == 200, offers_res.text
+        offers = offers_res.json()
+        assert any(o["id"] == 1 for o in offers)
+        etag = offers_res.headers["etag"]
+
+        cached = await ac.get("/offers", headers={"If-None-Match": etag})
+        assert cached.status_code == 304
+
+        # modification d'une offre : nouvelle version du catalogue
+        with database.SessionLocal() as db:
+            offer = db.get(models.Offer, 1)
+            description = offer.description
+            offer.description = "Catalogue modifié"
+            db.commit()
+        try:
+            changed = await ac.get("/offers", headers={"If-None-Match": etag})
+            assert changed.status_code == 200
+            assert changed.headers["etag"] != etag
+            assert next(o for o in changed.json() if o["id"] == 1)["description"] == "Catalogue modifié"
+        finally:
+            with database.SessionLocal() as db:
+                db.get(models.Offer, 1).description = description
+                db.commit()
+
+
+@pytest.mark.asyncio
+async def test_offers_concurrent_refresh(monkeypatch):
+    """Rechargements concurrents du catalogue : aucune requête ne bloque la boucle d'événements"""
+
+    from catalog import catalog
+    # chaque requête relit la version (intervalle nul)
+    monkeypatch.setattr(catalog, "check_interval", 0)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        responses = await asyncio.gather(*(ac.get("/offers") for _ in range(20)))
+    assert all(res.status_code == 200 for res in responses)
+    assert len({res.headers["etag"] for res in responses}) == 1
+
+
+@pytest.mark.asyncio
+async def test_offers_catalog_sql_edit(monkeypatch):
+    """Offre modifiée hors ORM (SQL brut, scripts) : le trigger change aussi la version"""
+
+    from catalog import catalog
+    monkeypatch.setattr(catalog, "check_interval", 0)
+    offers = models.Offer.__table__
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        await ac.get("/offers")
+        with database.engine.begin() as conn:
+            description = conn.scalar(select(offers.c.description).where(offers.c.id == 1))
+            conn.execute(update(offers).where(offers.c.id == 1).values(description="Modifié en SQL"))
+        try:
+            changed = await ac.get("/offers")
+            assert next(o for o in changed.json() if o["id"] == 1)["description"] == "Modifié en SQL"
+        finally:
+            with database.engine.begin() as conn:
+                conn.execute(update(offers).where(offers.c.id == 1).values(description=description))
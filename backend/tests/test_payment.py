@@ -55,3 +55,129 @@ async def test_payment_flow():
         assert my_tickets.status_code == 200
         updated_ticket = next(t for t in my_tickets.json() if t["id"] == ticket["id"])
         assert updated_ticket["is_paid"] is True
+
+        # 6) Nouveau paiement du même ticket : QR et date de paiement inchangés
+        again = await ac.post("/payment/simulate", json={"ticket_id": ticket["id"]}, headers=headers)
+        assert again.status_code == 200, again.text
+        assert again.json()["qr_payload"] == pay_data["qr_payload"]
+        my_tickets = await ac.get("/tickets/me", headers=headers)
+        assert next(t for t in my_tickets.json() if t["id"] == ticket["id"])["payment_date"] == updated_ticket["payment_date"]
+
+
+@pytest.mark.asyncio
+async def test_checkout_cart():
+    """Paiement d'un panier (tickets + réservations) en une requête"""
+
+    test_user = {
+        "username": "cart_user",
+        "email": "cart_user@example.com",
+        "password": "secret123"
+    }
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        await ac.post("/auth/register", json=test_user)
+        login_res = await ac.post(
+            "/auth/login",
+            json={"email": test_user["email"], "password": test_user["password"]}
+        )
+        assert login_res.status_code == 200, login_res.text
+        headers = {"Authorization": f"Bearer {login_res.json()['access_token']}"}
+
+        tickets = [(await ac.post("/tickets/?offer_id=1", headers=headers)).json()["id"] for _ in range(2)]
+        bulk_res = await ac.post(
+            "/reservations/bulk",
+            json=[
+                {"username": test_user["username"], "email": test_user["email"],
+                 "date": "2025-09-15", "offre": "Duo", "quantity": 1}
+                for _ in range(2)
+            ],
+            headers=headers
+        )
+        reservations = [r["id"] for r in bulk_res.json()["results"]]
+
+        cart_res = await ac.post(
+            "/payment/checkout",
+            json={"ticket_ids": tickets + [999999], "reservation_ids": reservations},
+            headers=headers
+        )
+        assert cart_res.status_code == 200, cart_res.text
+        cart = cart_res.json()
+        assert cart["paid"] == 4 and cart["failed"] == 1
+        paid = [r for r in cart["results"] if r["status"] == "ok"]
+        assert all(r["paid"] and r["qr_payload"].startswith(f"OLY-{r['ticket_id']}-") for r in paid)
+        assert [r["reservation_id"] for r in paid[2:]] == reservations
+
+        my_reservs = await ac.get("/reservations?fields=status", headers=headers)
+        statuses = {r["id"]: r["status"] for r in my_reservs.json()}
+        assert all(statuses[rid] == "confirmed" for rid in reservations)
+
+        # rejouer le panier ne crée pas de nouveaux tickets
+        again = await ac.post("/payment/checkout", json={"reservation_ids": reservations}, headers=headers)
+        assert [r["ticket_id"] for r in again.json()["results"]] == [r["ticket_id"] for r in paid[2:]]
+
+
+@pytest.mark.asyncio
+async def test_payment_idempotency_key():
+    """Les rejeux d'un paiement avec la même Idempotency-Key ne sont exécutés qu'une fois"""
+    import asyncio
+    import uuid
+
+    test_user = {
+        "username": "idem_user",
+        "email": "idem_user@example.com",
+        "password": "secret123"
+    }
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        await ac.post("/auth/register", json=test_user)
+        login_res = await ac.post(
+            "/auth/login",
+            json={"email": test_user["email"], "password": test_user["password"]}
+        )
+        assert login_res.status_code == 200, login_res.text
+        headers = {"Authorization": f"Bearer {login_res.json()['access_token']}"}
+
+        bulk_res = await ac.post(
+            "/reservations/bulk",
+            json=[{"username": test_user["username"], "email": test_user["email"],
+                   "date": "2025-09-16", "offre": "Solo", "quantity": 1}],
+            headers=headers
+        )
+        reservation_id = bulk_res.json()["results"][0]["id"]
+        tickets_before = len((await ac.get("/tickets/me?fields=id", headers=headers)).json())
+
+        # requêtes concurrentes : un seul ticket auto-créé
+        key_headers = {**headers, "Idempotency-Key": str(uuid.uuid4())}
+        first, second = await asyncio.gather(
+            ac.post("/payment/simulate", json={"reservation_id": reservation_id}, headers=key_headers),
+            ac.post("/payment/simulate", json={"reservation_id": reservation_id}, headers=key_headers),
+        )
+        assert first.status_code == second.status_code == 200, first.text
+        assert first.json() == second.json()
+        assert {first.headers.get("idempotent-replayed"), second.headers.get("idempotent-replayed")} == {None, "true"}
+
+        replay = await ac.post("/payment/simulate", json={"reservation_id": reservation_id}, headers=key_headers)
+        assert replay.json() == first.json()
+        assert replay.headers["idempotent-replayed"] == "true"
+
+        # cache mémoire vidé (redémarrage, autre worker) : réponse relue depuis la table
+        import idempotency
+        idempotency.response_cache.clear()
+        replay = await ac.post("/payment/simulate", json={"reservation_id": reservation_id}, headers=key_headers)
+        assert replay.json() == first.json()
+        assert replay.headers["idempotent-replayed"] == "true"
+
+        tickets_after = len((await ac.get("/tickets/me?fields=id", headers=headers)).json())
+        assert tickets_after == tickets_before + 1
+
+        # même clé, autre requête : refusée
+        other = await ac.post("/payment/simulate", json={"ticket_id": first.json()["ticket_id"]}, headers=key_headers)
+        assert other.status_code == 422
+
+        # les erreurs sont aussi mémorisées
+        missing_headers = {**headers, "Idempotency-Key": str(uuid.uuid4())}
+        missing = await ac.post("/payment/simulate", json={"ticket_id": 999999}, headers=missing_headers)
+        assert missing.status_code == 404
+        missing_again = await ac.post("/payment/simulate", json={"ticket_id": 999999}, headers=missing_headers)
+        assert missing_again.status_code == 404
+        assert missing_again.headers["idempotent-replayed"] == "true"
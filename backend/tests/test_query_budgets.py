@@ -0,0 +1,106 @@
+import pytest
+from httpx import AsyncClient, ASGITransport
+import sys, os
+
+# pour trouver main.py
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import app
+from catalog import catalog
+
+ADMIN_EMAIL = "contact@jo-paris2024.com"
+ADMIN_PASSWORD = "France-2026*"
+
+# tailles du jeu de données de l'utilisateur (réservations, tickets, panier)
+SIZES = (1, 5, 25)
+
+# budget de requêtes SQL par endpoint, identique quelle que soit la taille
+BUDGETS = {
+    "POST /reservations/bulk": 3,
+    "POST /tickets/": 4,
+    "POST /payment/checkout": 6,
+    "GET /reservations": 1,
+    "GET /tickets/me": 1,
+    "GET /reservations/stats": 1,
+    "GET /reservations/stats (cache)": 0,
+    "GET /admin/reservations/all": 1,
+    "GET /admin/stats": 1,
+    "GET /offers": 0,
+}
+
+
+@pytest.mark.asyncio
+async def test_query_budgets(query_budget, monkeypatch):
+    """Nombre de requêtes SQL borné et constant quand les données grandissent (pas de N+1)"""
+
+    # pas de revérification périodique du catalogue pendant la mesure
+    monkeypatch.setattr(catalog, "check_interval", 3600)
+    test_user = {
+        "username": "budget_user",
+        "email": "budget_user@example.com",
+        "password": "secret123"
+    }
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        await ac.post("/auth/register", json=test_user)
+        login_res = await ac.post(
+            "/auth/login",
+            json={"email": test_user["email"], "password": test_user["password"]}
+        )
+        headers = {"Authorization": f"Bearer {login_res.json()['access_token']}"}
+        admin_login = await ac.post("/auth/login", json={"email": ADMIN_EMAIL, "password": ADMIN_PASSWORD})
+        admin_headers = {"Authorization": f"Bearer {admin_login.json()['access_token']}"}
+
+        reads = [
+            ("GET /reservations", "/reservations?limit=1000", headers),
+            ("GET /tickets/me", "/tickets/me?limit=1000", headers),
+            ("GET /reservations/stats", "/reservations/stats", headers),
+            ("GET /reservations/stats (cache)", "/reservations/stats", headers),
+            ("GET /admin/reservations/all", "/admin/reservations/all?limit=1000", admin_headers),
+            ("GET /admin/stats", "/admin/stats", admin_headers),
+            ("GET /offers", "/offers", headers),
+        ]
+        # caches chauds (utilisateurs, catalogue) et lignes de stock/compteurs créées avant de mesurer
+        for _, url, h in reads:
+            await ac.get(url, headers=h)
+        await ac.post(
+            "/reservations/bulk",
+            json=[{"username": test_user["username"], "email": test_user["email"],
+                   "date": "2025-09-15", "offre": "Solo", "quantity": 1}],
+            headers=headers
+        )
+        await ac.post("/tickets/?offer_id=1", headers=headers)
+
+        counts = {name: [] for name in BUDGETS}
+
+        async def measure(name, request):
+            with query_budget(BUDGETS[name], name) as queries:
+                res = await request()
+            assert res.status_code == 200, res.text
+            counts[name].append(queries.count)
+            return res
+
+        for size in SIZES:
+            bulk = await measure("POST /reservations/bulk", lambda: ac.post(
+                "/reservations/bulk",
+                json=[
+                    {"username": test_user["username"], "email": test_user["email"],
+                     "date": "2025-09-15", "offre": "Solo", "quantity": 1}
+                    for _ in range(size)
+                ],
+                headers=headers
+            ))
+            reservations = [r["id"] for r in bulk.json()["results"]]
+            tickets = []
+            for _ in range(size):
+                ticket = await measure("POST /tickets/", lambda: ac.post("/tickets/?offer_id=1", headers=headers))
+                tickets.append(ticket.json()["id"])
+            await measure("POST /payment/checkout", lambda: ac.post(
+                "/payment/checkout",
+                json={"ticket_ids": tickets, "reservation_ids": reservations},
+                headers=headers
+            ))
+            for name, url, h in reads:
+                await measure(name, lambda: ac.get(url, headers=h))
+
+        for name, per_size in counts.items():
+            assert len(set(per_size)) == 1, f"{name} : requêtes SQL selon la taille {per_size}"
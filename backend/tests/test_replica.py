@@ -0,0 +1,94 @@
+import pytest
+import sqlite3
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import delete
+import sys, os
+
+# pour trouver main.py
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import app
+import database
+import models
+import replica
+import stats
+
+
+@pytest.fixture
+def stale_replica(tmp_path, monkeypatch):
+    """Réplica SQLite : copie du primaire, qui ne reçoit plus rien ensuite"""
+    if database.engine.dialect.name != "sqlite":
+        pytest.skip("copie du primaire par l'API de sauvegarde SQLite")
+    path = str(tmp_path / "replica.db")
+
+    def snapshot():
+        source, target = sqlite3.connect(database.engine.url.database), sqlite3.connect(path)
+        with target:
+            source.backup(target)
+        source.close()
+        target.close()
+        database.set_read_replica(f"sqlite:///{path}")
+        monkeypatch.setattr(replica, "monitor", replica.ReplicaMonitor())
+        replica.recent_writes.clear()
+
+    yield snapshot
+    database.reset_async_engine()
+    database.set_read_replica(None)
+
+
+@pytest.mark.asyncio
+async def test_read_replica_routing(stale_replica, monkeypatch):
+    """Lectures sur le réplica, sauf après une écriture du client ou si le réplica est en retard"""
+
+    test_user = {
+        "username": "replica_user",
+        "email": "replica_user@example.com",
+        "password": "secret123"
+    }
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        await ac.post("/auth/register", json=test_user)
+        login_res = await ac.post(
+            "/auth/login",
+            json={"email": test_user["email"], "password": test_user["password"]}
+        )
+        headers = {"Authorization": f"Bearer {login_res.json()['access_token']}"}
+
+        before = (await ac.post("/tickets/?offer_id=1", headers=headers)).json()["id"]
+        stale_replica()
+        after = (await ac.post("/tickets/?offer_id=1", headers=headers)).json()["id"]
+
+        def ids(res):
+            assert res.status_code == 200, res.text
+            return {t["id"] for t in res.json()}
+
+        # lecture de ses propres écritures : primaire
+        assert {before, after} <= ids(await ac.get("/tickets/me?fields=id", headers=headers))
+
+        # fenêtre écoulée : réplica, qui n'a pas encore le second ticket
+        replica.recent_writes.clear()
+        mine = ids(await ac.get("/tickets/me?fields=id", headers=headers))
+        assert before in mine and after not in mine
+        assert replica.monitor.status() == {"healthy": True, "lag": 0.0}
+
+        # stats lues sur le réplica : jamais mises en cache
+        user_id = (await ac.get("/auth/me", headers=headers)).json()["id"]
+        stats.user_stats_cache.pop(user_id)
+        assert (await ac.get("/reservations/stats", headers=headers)).status_code == 200
+        assert user_id not in stats.user_stats_cache
+
+        # réplica trop en retard : retour au primaire
+        monkeypatch.setattr(replica, "DB_REPLICA_MAX_LAG", -1)
+        replica.monitor.checked_at = 0.0
+        assert after in ids(await ac.get("/tickets/me?fields=id", headers=headers))
+
+        # réplica injoignable : idem
+        monkeypatch.setattr(replica, "DB_REPLICA_MAX_LAG", 5)
+        monkeypatch.setattr(replica.monitor, "check", lambda: False)
+        replica.monitor.checked_at = 0.0
+        replica.monitor.healthy = False
+        assert after in ids(await ac.get("/tickets/me?fields=id", headers=headers))
+
+    # aucune écriture possible sur une session du réplica
+    async with database.open_session(replica=True) as db:
+        with pytest.raises(replica.ReadOnlySessionError):
+            await db.execute(delete(models.Ticket))
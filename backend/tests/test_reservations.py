@@ -54,6 +54,84 @@ async def test_reservations_flow():
         assert my_reservs.status_code == 200, my_reservs.text
         assert any(r["id"] == reservation["id"] for r in my_reservs.json())
 
+        filtered = await ac.get(
+            "/reservations?status=pending_payment&date_from=2025-09-12&date_to=2025-09-12&fields=date,offer",
+            headers=headers,
+        )
+        assert filtered.status_code == 200, filtered.text
+        assert {"id": reservation["id"], "date": "2025-09-12", "offer": "Solo"} in filtered.json()
+
         # 5) Vérifier les stats
         stats_res = await ac.get("/reservations/stats", headers=headers)
         assert stats_res.status_code == 200, stats_res.text
+        before = stats_res.json()
+        assert before["reservations"] >= 1
+
+        # 6) Payer la réservation puis récupérer son QR code (cache ETag)
+        pay_res = await ac.post("/payment/simulate", json={"reservation_id": reservation["id"]}, headers=headers)
+        assert pay_res.status_code == 200, pay_res.text
+
+        # stats en cache invalidées par le paiement (ticket créé et payé)
+        after = (await ac.get("/reservations/stats", headers=headers)).json()
+        assert after == {
+            "reservations": before["reservations"],
+            "tickets": before["tickets"] + 1,
+            "paid_tickets": before["paid_tickets"] + 1,
+        }
+
+        qr_res = await ac.get(f"/reservations/{reservation['id']}/qrcode", headers=headers)
+        assert qr_res.status_code == 200, qr_res.text
+        assert qr_res.headers["content-type"] == "image/png"
+        etag = qr_res.headers["etag"]
+
+        cached = await ac.get(
+            f"/reservations/{reservation['id']}/qrcode",
+            headers={**headers, "If-None-Match": etag},
+        )
+        assert cached.status_code == 304
+
+        svg = await ac.get(f"/reservations/{reservation['id']}/qrcode?format=svg", headers=headers)
+        assert svg.status_code == 200, svg.text
+        assert svg.headers["content-type"].startswith("image/svg+xml")
+
+
+@pytest.mark.asyncio
+async def test_bulk_reservations():
+    """Création de plusieurs réservations en une requête"""
+
+    test_user = {
+        "username": "bulk_user",
+        "email": "bulk_user@example.com",
+        "password": "secret123"
+    }
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        await ac.post("/auth/register", json=test_user)
+        login_res = await ac.post(
+            "/auth/login",
+            json={"email": test_user["email"], "password": test_user["password"]}
+        )
+        assert login_res.status_code == 200, login_res.text
+        headers = {"Authorization": f"Bearer {login_res.json()['access_token']}"}
+
+        item = {"username": test_user["username"], "email": test_user["email"], "quantity": 1}
+        bulk_res = await ac.post(
+            "/reservations/bulk",
+            json=[
+                {**item, "date": "2025-09-13", "offre": "Solo"},
+                {**item, "date": "2025-09-14", "offre": "Duo"},
+                {**item, "date": "2025-09-14", "offre": "Offre inconnue"},
+            ],
+            headers=headers
+        )
+        assert bulk_res.status_code == 200, bulk_res.text
+        body = bulk_res.json()
+        assert body["created"] == 2 and body["failed"] == 1
+        assert [r["status"] for r in body["results"]] == [201, 201, 404]
+
+        my_reservs = await ac.get("/reservations?fields=id", headers=headers)
+        ids = {r["id"] for r in my_reservs.json()}
+        assert {r["id"] for r in body["results"][:2]} <= ids
+
+        empty = await ac.post("/reservations/bulk", json=[], headers=headers)
+        assert empty.status_code == 422
@@ -55,3 +55,27 @@ async def test_tickets_flow():
         )
         assert payment_res.status_code == 200, payment_res.text
         assert payment_res.json().get("paid") is True
+
+        # 6) Filtre, projection et pagination par curseur
+        paid_tickets = await ac.get("/tickets/me?paid=true&fields=id,is_paid,qr_code", headers=headers)
+        assert paid_tickets.status_code == 200, paid_tickets.text
+        assert any(t["id"] == ticket["id"] for t in paid_tickets.json())
+        assert all(set(t) == {"id", "is_paid", "qr_code"} and t["is_paid"] for t in paid_tickets.json())
+
+        unpaid = await ac.get("/tickets/me?paid=false&fields=id", headers=headers)
+        assert all(t["id"] != ticket["id"] for t in unpaid.json())
+
+        await ac.post("/tickets/?offer_id=1", headers=headers)
+        # sans limit ni cursor : tous les tickets, sans en-tête de page suivante
+        everything = await ac.get("/tickets/me?fields=id", headers=headers)
+        assert "x-next-cursor" not in everything.headers
+        assert ticket["id"] in {t["id"] for t in everything.json()}
+
+        page = await ac.get("/tickets/me?limit=1", headers=headers)
+        assert len(page.json()) == 1
+        cursor = page.headers["x-next-cursor"]
+        next_page = await ac.get(f"/tickets/me?limit=1&cursor={cursor}", headers=headers)
+        assert next_page.json()[0]["id"] < page.json()[0]["id"]
+
+        bad_fields = await ac.get("/tickets/me?fields=id,secret", headers=headers)
+        assert bad_fields.status_code == 400
@@ -1,5 +1,4 @@
 import secrets
-import qrcode
 from io import BytesIO
 import base64
 
@@ -9,6 +8,8 @@ def generate_random_key(length=16):
 
 def generate_qr_code(data):
     """Génère un QR code en base64"""
+    import qrcode  # import différé (qrcode/PIL)
+
     qr = qrcode.QRCode(
         version=1,
         error_correction=qrcode.constants.ERROR_CORRECT_L,
@@ -22,4 +23,11 @@ def generate_qr_code(data):
     
     buffered = BytesIO()
     img.save(buffered, format="PNG")
-    return base64.b64encode(buffered.getvalue()).decode()
\ No newline at end of file
+    return base64.b64encode(buffered.getvalue()).decode()
+
+def etag_matches(if_none_match, etag):
+    """Vrai si l'en-tête If-None-Match couvre l'ETag (forme '"<etag>"')"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates